@@ -0,0 +1,116 @@
+"""create property history table
+
+Revision ID: 9f1cdcd4faca
+Revises: 9a15203fc34b
+Create Date: 2026-10-18 14:38:34.651432
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f1cdcd4faca'
+down_revision: Union[str, None] = '9a15203fc34b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK_SIZE = 1000
+# the tracked fields as of this revision
+FIELDS = (
+    'title',
+    'property_type',
+    'price',
+    'additional_price',
+    'address',
+    'properties',
+    'description',
+    'price_cents',
+    'condo_fee_cents',
+    'area_m2',
+    'bedrooms',
+    'bathrooms',
+    'parking_spaces',
+)
+
+properties = sa.table(
+    'properties',
+    sa.column('id', sa.Integer),
+    sa.column('property_id', sa.Integer),
+    sa.column('region', sa.String),
+    sa.column('last_changed_at', sa.DateTime),
+    sa.column('created_at', sa.DateTime),
+    *(
+        sa.column(f, sa.JSON)
+        if f in ('additional_price', 'properties', 'description')
+        else sa.column(f)
+        for f in FIELDS
+    ),
+)
+history = sa.table(
+    'property_history',
+    sa.column('property_id', sa.Integer),
+    sa.column('observed_at', sa.DateTime),
+    sa.column('changes', sa.JSON),
+    sa.column('region', sa.String),
+    sa.column('price_cents', sa.Integer),
+)
+
+
+def seed() -> None:
+    """A first observation per stored listing, a chunk at a time."""
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(properties)
+            .where(properties.c.id > last_id)
+            .order_by(properties.c.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        observations = []
+        for row in rows:
+            changes = {
+                f: getattr(row, f) for f in FIELDS
+                if getattr(row, f) not in (None, '', [])
+            }
+            observations.append({
+                'property_id': row.property_id,
+                'observed_at': row.last_changed_at or row.created_at,
+                'changes': changes,
+                'region': row.region,
+                'price_cents': row.price_cents,
+            })
+        bind.execute(sa.insert(history), observations)
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('property_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('property_id', sa.Integer(), nullable=False),
+    sa.Column('observed_at', sa.DateTime(), nullable=False),
+    sa.Column('changes', sa.JSON(), nullable=False),
+    sa.Column('region', sa.String(), nullable=True),
+    sa.Column('price_cents', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # ### end Alembic commands ###
+    seed()
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_index('ix_property_history_listing', 'property_history', ['property_id', 'observed_at'], unique=False)
+    op.create_index('ix_property_history_region', 'property_history', ['region', 'observed_at'], unique=False)
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index('ix_property_history_region', table_name='property_history')
+    op.drop_index('ix_property_history_listing', table_name='property_history')
+    op.drop_table('property_history')
+    # ### end Alembic commands ###
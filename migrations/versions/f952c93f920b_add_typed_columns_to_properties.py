@@ -0,0 +1,204 @@
+"""add typed columns to properties
+
+Revision ID: f952c93f920b
+Revises: 6fecf793b84b
+Create Date: 2026-10-18 14:34:28.712096
+
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f952c93f920b'
+down_revision: Union[str, None] = '6fecf793b84b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK_SIZE = 1000
+# the parsing as of this revision, kept here so later changes to
+# scraping_houses.normalize don't change what this backfill writes
+NUMBER = re.compile(r'\d[\d.]*(?:,\d+)?')
+AMENITIES = {
+    'm²': 'area_m2',
+    'quarto': 'bedrooms',
+    'banheiro': 'bathrooms',
+    'vaga': 'parking_spaces',
+}
+AGO = re.compile(r'há\s+(\d+|um|uma)\s+(\w+)')
+UNITS = {
+    'minuto': timedelta(minutes=1),
+    'hora': timedelta(hours=1),
+    'dia': timedelta(days=1),
+    'semana': timedelta(weeks=1),
+    'mês': timedelta(days=30),
+    'mese': timedelta(days=30),
+    'ano': timedelta(days=365),
+}
+
+properties = sa.table(
+    'properties',
+    sa.column('id', sa.Integer),
+    sa.column('price', sa.String),
+    sa.column('additional_price', sa.JSON),
+    sa.column('properties', sa.JSON),
+    sa.column('published_at', sa.String),
+    sa.column('last_changed_at', sa.DateTime),
+    sa.column('created_at', sa.DateTime),
+    sa.column('price_cents', sa.Integer),
+    sa.column('condo_fee_cents', sa.Integer),
+    sa.column('area_m2', sa.Integer),
+    sa.column('bedrooms', sa.Integer),
+    sa.column('bathrooms', sa.Integer),
+    sa.column('parking_spaces', sa.Integer),
+    sa.column('published_on', sa.DateTime),
+)
+
+
+def parse_money_cents(text):
+    match = NUMBER.search(text or '')
+    if not match:
+        return None
+    units, _, cents = match.group().replace('.', '').partition(',')
+    return int(units) * 100 + int((cents + '00')[:2])
+
+
+def parse_amenities(items):
+    parsed = {}
+    for item in items:
+        text = item.lower()
+        match = NUMBER.search(text)
+        if not match:
+            continue
+        for unit, field in AMENITIES.items():
+            if unit in text[match.end():] and field not in parsed:
+                number = match.group().replace('.', '').partition(',')[0]
+                parsed[field] = int(number)
+                break
+    return parsed
+
+
+def parse_published_at(text, now):
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        published = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        pass
+    else:
+        if published.tzinfo:
+            published = published.astimezone().replace(tzinfo=None)
+        return published
+    text = text.lower()
+    if 'hoje' in text:
+        return now
+    if 'ontem' in text:
+        return now - UNITS['dia']
+    match = AGO.search(text)
+    if not match:
+        return None
+    count, unit = match.groups()
+    count = 1 if count in {'um', 'uma'} else int(count)
+    step = UNITS.get(unit.rstrip('s')) or UNITS.get(unit)
+    return now - count * step if step else None
+
+
+def normalize_fields(price, additional_price, properties, published_at, now):
+    fields = dict.fromkeys(
+        ('price_cents', 'condo_fee_cents', *AMENITIES.values())
+    )
+    fields['price_cents'] = parse_money_cents(price)
+    if additional_price:
+        fields['condo_fee_cents'] = parse_money_cents(additional_price[0])
+    fields.update(parse_amenities(properties or []))
+    fields['published_on'] = parse_published_at(published_at, now)
+    return fields
+
+
+def backfill() -> None:
+    """Parse the text columns of existing rows, a chunk at a time.
+
+    "Publicado há 3 dias" counts back from when the row last changed,
+    the closest we have to when that text was read. Regions were never
+    stored, they stay empty until the next crawl.
+    """
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                properties.c.id,
+                properties.c.price,
+                properties.c.additional_price,
+                properties.c.properties,
+                properties.c.published_at,
+                properties.c.last_changed_at,
+                properties.c.created_at,
+            )
+            .where(properties.c.id > last_id)
+            .order_by(properties.c.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            sa.update(properties)
+            .where(properties.c.id == sa.bindparam('row_id')),
+            # executemany; the other keys are the columns to set
+            [
+                {
+                    'row_id': row.id,
+                    **normalize_fields(
+                        row.price,
+                        row.additional_price,
+                        row.properties,
+                        row.published_at,
+                        row.last_changed_at or row.created_at,
+                    ),
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column('properties', sa.Column('price_cents', sa.Integer(), nullable=True))
+    op.add_column('properties', sa.Column('condo_fee_cents', sa.Integer(), nullable=True))
+    op.add_column('properties', sa.Column('area_m2', sa.Integer(), nullable=True))
+    op.add_column('properties', sa.Column('bedrooms', sa.Integer(), nullable=True))
+    op.add_column('properties', sa.Column('bathrooms', sa.Integer(), nullable=True))
+    op.add_column('properties', sa.Column('parking_spaces', sa.Integer(), nullable=True))
+    op.add_column('properties', sa.Column('published_on', sa.DateTime(), nullable=True))
+    op.add_column('properties', sa.Column('region', sa.String(), nullable=True))
+    # ### end Alembic commands ###
+    backfill()
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_index(op.f('ix_properties_area_m2'), 'properties', ['area_m2'], unique=False)
+    op.create_index(op.f('ix_properties_price_cents'), 'properties', ['price_cents'], unique=False)
+    op.create_index(op.f('ix_properties_published_on'), 'properties', ['published_on'], unique=False)
+    op.create_index('ix_properties_search', 'properties', ['region', 'bedrooms', 'price_cents'], unique=False)
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index('ix_properties_search', table_name='properties')
+    op.drop_index(op.f('ix_properties_published_on'), table_name='properties')
+    op.drop_index(op.f('ix_properties_price_cents'), table_name='properties')
+    op.drop_index(op.f('ix_properties_area_m2'), table_name='properties')
+    op.drop_column('properties', 'region')
+    op.drop_column('properties', 'published_on')
+    op.drop_column('properties', 'parking_spaces')
+    op.drop_column('properties', 'bathrooms')
+    op.drop_column('properties', 'bedrooms')
+    op.drop_column('properties', 'area_m2')
+    op.drop_column('properties', 'condo_fee_cents')
+    op.drop_column('properties', 'price_cents')
+    # ### end Alembic commands ###
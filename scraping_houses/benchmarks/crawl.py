@@ -0,0 +1,149 @@
+"""End-to-end crawl benchmark against the local stand-in portal.
+
+The portal runs in its own process so it does not share the crawler's
+event loop or GIL. The crawl goes through `ScrapingVivalreal.run()` into
+a fresh SQLite database, and the results land in a JSON file meant to
+be diffed across commits.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from scraping_houses.benchmarks.portal import serve
+from scraping_houses.database import create_db_engine
+from scraping_houses.models import table_registry
+from scraping_houses.schemas import CrawlConfig, PortalConfig, UrlConfig
+from scraping_houses.scrapings.vivareal import ScrapingVivalreal
+from scraping_houses.utils import cl, logger
+
+
+def percentiles(
+    samples: List[float],
+    points: tuple = (50, 95, 99),
+) -> Dict[str, float]:
+    """Nearest-rank percentiles, in milliseconds."""
+    ranked = sorted(samples)
+    if not ranked:
+        return {f'p{p}': 0.0 for p in points}
+    return {
+        f'p{p}': round(
+            ranked[min(len(ranked) - 1, -(-p * len(ranked) // 100) - 1)]
+            * 1000,
+            3,
+        )
+        for p in points
+    }
+
+
+def summary(samples: List[float]) -> Dict[str, float]:
+    mean = sum(samples) / len(samples) if samples else 0.0
+    return {'mean': round(mean * 1000, 3), **percentiles(samples)}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(host: str, port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def serve_portal(config_json: str):
+    serve(PortalConfig.model_validate_json(config_json))
+
+
+def run_benchmark(
+    portal_cfg: PortalConfig,
+    url_cfg: UrlConfig,
+    crawl_cfg: CrawlConfig,
+    output: str,
+    log_level: int = logging.WARNING,
+) -> dict:
+    portal_cfg = portal_cfg.model_copy(update={'port': free_port()})
+    crawl_cfg = crawl_cfg.model_copy(update={'sample_timings': True})
+    url_cfg = url_cfg.model_copy(
+        update={'url_base': f'http://{portal_cfg.host}:{portal_cfg.port}'}
+    )
+    portal = multiprocessing.get_context('spawn').Process(
+        target=serve_portal,
+        args=(portal_cfg.model_dump_json(),),
+        daemon=True,
+    )
+    portal.start()
+    level = logger.level
+    logger.setLevel(log_level)
+    with tempfile.TemporaryDirectory() as tmp:
+        # a fresh database, so resume/frontier state never skews a run
+        engine = create_db_engine(f'sqlite:///{Path(tmp) / "benchmark.db"}')
+        table_registry.metadata.create_all(engine)
+        try:
+            wait_for(portal_cfg.host, portal_cfg.port)
+            scraper = ScrapingVivalreal(url_cfg, crawl_cfg, engine)
+            asyncio.run(scraper.run())
+        finally:
+            engine.dispose()
+            logger.setLevel(level)
+            portal.terminate()
+            portal.join()
+
+    stats = scraper.stats
+    results = {
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'portal': portal_cfg.model_dump(exclude={'host', 'port'}),
+        'crawl': crawl_cfg.model_dump(),
+        'elapsed': round(stats.elapsed, 3),
+        'listing_pages': stats.listing_pages,
+        'detail_pages': stats.detail_pages,
+        'errors': stats.errors,
+        'listing_pages_per_second': round(stats.listing_pages_per_second, 3),
+        'detail_pages_per_second': round(stats.detail_pages_per_second, 3),
+        'request_latency_ms': percentiles(stats.latencies),
+        'parse_ms_per_page': summary(stats.parse_times),
+        'write_ms_per_property': summary(stats.write_times),
+        'flushes': stats.flushes,
+        'flush_ms': summary(stats.flush_times),
+        'max_write_queue_depth': stats.max_write_queue_depth,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(
+        json.dumps(results, indent=2, default=str), encoding='utf-8'
+    )
+    cl.print_json(data=results, default=str)
+    return results
@@ -0,0 +1,183 @@
+"""Parser micro-benchmarks over a corpus of saved pages.
+
+The corpus is a directory of `<kind>-<name>.html` files, where kind is
+`listing`, `detail` or `trace`. `seed_fixtures` fills it with the html
+resources of the `trace.py` archive plus listing and detail pages from
+the stand-in portal; pages recorded in a response cache can be added
+with `cache_path`.
+"""
+
+import gc
+import json
+import logging
+import time
+import tracemalloc
+import zipfile
+from http import HTTPStatus
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from rich.markup import escape
+from rich.table import Table
+
+from scraping_houses.benchmarks.portal import (
+    Catalogue,
+    load_trace,
+    make_listings,
+)
+from scraping_houses.cache import ResponseCache
+from scraping_houses.schemas import Property, settings
+from scraping_houses.scrapings.vivareal import PAGE_SIZE, ScrapingVivalreal
+from scraping_houses.utils import cl, logger
+
+KINDS = ('listing', 'detail', 'trace')
+
+
+def seed_fixtures(
+    path: str,
+    trace_path: str = settings.TRACE_PATH,
+    pages: int = 10,
+    seed: int = 0,
+):
+    out = Path(path)
+    out.mkdir(parents=True, exist_ok=True)
+    try:
+        with zipfile.ZipFile(trace_path) as archive:
+            for name in archive.namelist():
+                if name.startswith('resources/') and name.endswith('.html'):
+                    (out / f'trace-{Path(name).name}').write_bytes(
+                        archive.read(name)
+                    )
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.warning(f'[BENCHMARK] no trace at {trace_path}: {e}')
+    _, head = load_trace(trace_path)
+    catalogue = Catalogue(make_listings(pages * PAGE_SIZE * 3, seed), head)
+    for page in range(1, pages + 1):
+        (out / f'listing-{page}.html').write_bytes(
+            catalogue.listing('/aluguel/sp/sao-paulo/', {'pagina': page})
+        )
+    for p in catalogue.listings[:pages]:
+        (out / f'detail-{p.id}.html').write_bytes(catalogue.detail(p))
+
+
+def load_corpus(
+    path: str,
+    cache_path: str = '',
+) -> Dict[str, List[Tuple[str, str]]]:
+    """(url, html) of every page by kind.
+
+    A `detail-<id>.html` file is the page of listing `<id>`, so the
+    parser finds its own listing in the embedded json state.
+    """
+    corpus = {kind: [] for kind in KINDS}
+    for file in sorted(Path(path).glob('*.html')):
+        kind, _, name = file.stem.partition('-')
+        if kind in corpus:
+            corpus[kind].append(
+                (f'/imovel/x-id-{name}/', file.read_text(errors='replace'))
+            )
+    if cache_path:
+        cache = ResponseCache(cache_path, ttl={})
+        for kind in ('listing', 'detail'):
+            for url in cache.urls(kind):
+                hit = cache.get(url, kind, offline=True)
+                if hit and hit.status_code == HTTPStatus.OK:
+                    corpus[kind].append((url, hit.text))
+    return corpus
+
+
+def measure(
+    fn: Callable[[str, str], object],
+    pages: List[Tuple[str, str]],
+    repeat: int = 5,
+) -> Dict[str, float]:
+    """Best-of-`repeat` µs/page, and traced KiB allocated per page."""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        for url, html in pages:
+            fn(url, html)
+        best = min(best, time.perf_counter() - started)
+    # peak traced memory above the baseline, i.e. what one call
+    # allocates at once, including memory freed before it returns
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for url, html in pages:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(url, html)
+            allocated += tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return {
+        'pages': len(pages),
+        'us_per_page': round(best / len(pages) * 1e6, 1),
+        'kib_per_page': round(allocated / len(pages) / 1024, 1),
+    }
+
+
+def run_parser_benchmark(
+    fixtures: str,
+    output: str,
+    repeat: int = 5,
+    cache_path: str = '',
+) -> dict:
+    if not any(Path(fixtures).glob('*.html')):
+        seed_fixtures(fixtures)
+    corpus = load_corpus(fixtures, cache_path)
+    s = ScrapingVivalreal()
+
+    def page(fn: Callable[[str], object]) -> Callable[[str, str], object]:
+        return lambda url, html: fn(html)
+
+    cases = {
+        'extract_listing': (
+            page(lambda html: s.extract_listing(html, cards=False)),
+            corpus['listing'],
+        ),
+        'extract_listing[cards]': (
+            page(s.extract_listing), corpus['listing']
+        ),
+        'get_urls': (page(s.get_urls), corpus['listing']),
+        'get_total_properties': (
+            page(s.get_total_properties), corpus['listing']
+        ),
+        'get_current_page': (page(s.get_current_page), corpus['listing']),
+        # recorded pages without results: the cost of a miss
+        'get_urls[trace]': (page(s.get_urls), corpus['trace']),
+        'extract_all_content_from_page': (
+            lambda url, html: s.extract_all_content_from_page(
+                html, Property(url=url)
+            ),
+            corpus['detail'],
+        ),
+        'extract_from_css': (
+            lambda url, html: s.extract_from_css(html, Property(url=url)),
+            corpus['detail'],
+        ),
+    }
+    level = logger.level
+    # pages without the selector log an error each call
+    logger.setLevel(logging.CRITICAL)
+    try:
+        results = {
+            name: measure(fn, pages, repeat)
+            for name, (fn, pages) in cases.items()
+            if pages
+        }
+    finally:
+        logger.setLevel(level)
+
+    table = Table(title='Parser')
+    for column in ('function', 'pages', 'µs/page', 'KiB/page'):
+        table.add_column(column, justify='right')
+    for name, r in results.items():
+        table.add_row(escape(name), *(str(v) for v in r.values()))
+    cl.print(table)
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(
+        json.dumps(results, indent=2), encoding='utf-8'
+    )
+    return results
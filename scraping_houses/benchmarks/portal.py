@@ -0,0 +1,491 @@
+"""Local stand-in for the portal, for benchmarks and offline load tests.
+
+Responses come, in order, from a response cache recorded against the
+real site (`crawl --cache`), from the Playwright trace in `trace.py`,
+and from a seeded synthetic catalogue rendered with the same markup the
+scraper parses. Latency, 5xx errors and 429s are injected per request.
+Point the scraper at it with `UrlConfig(url_base=portal.url)` or
+`URL_VIVAREAL=http://127.0.0.1:8765`.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+from urllib.parse import parse_qs, urljoin, urlsplit
+
+from scraping_houses.cache import ResponseCache
+from scraping_houses.normalize import amenity_text
+from scraping_houses.schemas import (
+    FlagHouseType,
+    FlagPropertyType,
+    FlagRegion,
+    PortalConfig,
+)
+from scraping_houses.scrapings.planner import PRICE_CEILING
+from scraping_houses.scrapings.vivareal import PAGE_SIZE
+from scraping_houses.utils import logger
+
+Response = Tuple[int, str, bytes]
+
+# the real site the trace and the replay cache were recorded against;
+# not settings.URL_VIVAREAL, which may point at this stand-in
+PORTAL_ORIGIN = 'https://www.vivareal.com.br'
+
+NEIGHBORHOODS: Dict[FlagRegion, List[str]] = {
+    FlagRegion.SOUTH_ZONE: ['Moema', 'Vila Mariana', 'Saúde', 'Campo Belo'],
+    FlagRegion.NORTH_ZONE: ['Santana', 'Tucuruvi', 'Casa Verde'],
+    FlagRegion.CENTER_ZONE: ['República', 'Bela Vista', 'Consolação'],
+    FlagRegion.WEST_ZONE: ['Pinheiros', 'Perdizes', 'Lapa', 'Butantã'],
+    FlagRegion.EAST_ZONE: ['Tatuapé', 'Mooca', 'Penha', 'Itaquera'],
+}
+STREETS = ['Rua Augusta', 'Avenida Paulista', 'Rua Vergueiro', 'Rua Tuiuti']
+LABELS: Dict[FlagPropertyType, str] = {
+    FlagPropertyType.HOUSE: 'Casa',
+    FlagPropertyType.APARTMENT: 'Apartamento',
+    FlagPropertyType.CONDOMINIUM: 'Casa de Condomínio',
+    FlagPropertyType.TOWNHOUSE: 'Sobrado',
+    FlagPropertyType.FARM: 'Granja',
+    FlagPropertyType.KITNET: 'Kitnet',
+    FlagPropertyType.FLAT: 'Flat',
+    FlagPropertyType.ROOF: 'Cobertura',
+}
+DETAIL_PATH = re.compile(r'^/imovel/[^/]*-id-(\d+)/?$')
+# `createdAt` of the synthetic listings, fixed so pages are reproducible
+PUBLISHED_BASE = datetime(2024, 8, 4)
+
+
+@dataclass
+class Listing:
+    id: int
+    house_type: FlagHouseType
+    region: FlagRegion
+    property_type: FlagPropertyType
+    rooms: int
+    bathrooms: int
+    parking_spaces: int
+    area: int
+    price: int
+    condo_fee: int
+    street: str
+    number: int
+    neighborhood: str
+    published_days: int
+
+    @property
+    def address(self) -> str:
+        return (
+            f'{self.street}, {self.number} - {self.neighborhood}, '
+            'São Paulo - SP'
+        )
+
+    @property
+    def url(self) -> str:
+        label = LABELS[self.property_type].lower().replace(' ', '-')
+        return f'/imovel/{label}-{self.rooms}-quartos-id-{self.id}/'
+
+    @property
+    def photos(self) -> List[str]:
+        return [
+            f'https://resizedimgs.vivareal.com/{self.id}-{n}.jpg'
+            for n in range(8)
+        ]
+
+    @property
+    def title(self) -> str:
+        return (
+            f'{LABELS[self.property_type]} com {self.rooms} quartos, '
+            f'{self.area}m²'
+        )
+
+
+def brl(value: int) -> str:
+    return 'R$ ' + f'{value:,}'.replace(',', '.')
+
+
+def make_listings(count: int, seed: int = 0) -> List[Listing]:
+    rnd = random.Random(seed)
+    listings = []
+    for n in range(count):
+        house_type = rnd.choice(list(FlagHouseType))
+        region = rnd.choice(list(FlagRegion))
+        rooms = rnd.randint(1, 4)
+        area = rnd.randint(20, 60) * rooms
+        ceiling = PRICE_CEILING[house_type]
+        if house_type == FlagHouseType.HENT:
+            price = rnd.randint(800, ceiling // 20)
+        else:
+            price = rnd.randint(150_000, ceiling // 50)
+        listings.append(Listing(
+            id=2_000_000_000 + n,
+            house_type=house_type,
+            region=region,
+            property_type=rnd.choice(list(FlagPropertyType)),
+            rooms=rooms,
+            bathrooms=rnd.randint(1, rooms),
+            parking_spaces=rnd.randint(0, rooms),
+            area=area,
+            price=price,
+            condo_fee=rnd.choice([0, rnd.randint(200, 2000)]),
+            street=rnd.choice(STREETS),
+            number=rnd.randint(1, 3000),
+            neighborhood=rnd.choice(NEIGHBORHOODS[region]),
+            published_days=rnd.randint(0, 90),
+        ))
+    return listings
+
+
+def load_trace(path: Union[str, Path]) -> Tuple[Dict[str, Response], str]:
+    """Recorded portal responses by path, and the home page <head>."""
+    recorded: Dict[str, Response] = {}
+    head = '<!DOCTYPE html><html><head></head>'
+    try:
+        archive = zipfile.ZipFile(path)
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.warning(f'[PORTAL] no trace at {path}: {e}')
+        return recorded, head
+    with archive:
+        portal = urlsplit(PORTAL_ORIGIN).netloc
+        for line in archive.read('trace.network').decode().splitlines():
+            snapshot = json.loads(line).get('snapshot', {})
+            url = urlsplit(snapshot.get('request', {}).get('url', ''))
+            response = snapshot.get('response', {})
+            content = response.get('content', {})
+            if url.netloc != portal or not content.get('_sha1'):
+                continue
+            body = archive.read(f'resources/{content["_sha1"]}')
+            path = url.path + (f'?{url.query}' if url.query else '')
+            recorded[path] = (
+                response['status'], content.get('mimeType'), body
+            )
+    home = recorded.get('/')
+    if home:
+        html = home[2].decode()
+        head = html[:html.find('<body')]
+    return recorded, head
+
+
+class Catalogue:
+    """Search and render the synthetic listings like the portal does."""
+
+    def __init__(self, listings: List[Listing], head: str = ''):
+        self.listings = listings
+        self.by_id = {p.id: p for p in listings}
+        self.head = head
+
+    def page(self, body: str) -> bytes:
+        return f'{self.head}<body>{body}</body></html>'.encode()
+
+    def search(self, path: str, query: Dict[str, str]) -> List[Listing]:
+        parts = [p for p in path.split('/') if p]
+        house_type = FlagHouseType(parts[0])
+        regions = {str(r): r for r in FlagRegion}
+        types = {str(t): t for t in FlagPropertyType}
+        region = next((regions[p] for p in parts if p in regions), None)
+        wanted = {types[p] for p in parts if p in types}
+        wanted |= {
+            types[t] for t in query.get('tipos', '').split(',') if t in types
+        }
+        rooms = int(query.get('quartos', 0))
+        low = int(query.get('preco-desde', 0))
+        high = int(query.get('preco-ate', 0))
+        found = [
+            p for p in self.listings
+            if p.house_type == house_type
+            and (not region or p.region == region)
+            and (not wanted or p.property_type in wanted)
+            and (not rooms or p.rooms == rooms)
+            and p.price >= low
+            and (not high or p.price <= high)
+        ]
+        order = query.get('ordenar-por', '')
+        if order.startswith('preco'):
+            found.sort(key=lambda p: p.price, reverse=order.endswith('DESC'))
+        return found
+
+    @staticmethod
+    def card(p: Listing) -> str:
+        details = ''.join(
+            '<li class="property-card__detail-item '
+            f'property-card__detail-{name}">'
+            f'<span class="property-card__detail-value">{value}</span> '
+            f'{unit}</li>'
+            for name, value, unit in (
+                ('area', p.area, 'm²'),
+                ('room', p.rooms, 'Quartos'),
+                ('bathroom', p.bathrooms, 'Banheiros'),
+                ('garage', p.parking_spaces, 'Vagas'),
+            )
+        )
+        return (
+            '<article class="property-card__container js-property-card">'
+            f'<a class="property-card__content-link js-card-title" '
+            f'href="{p.url}">'
+            f'<h2 class="property-card__header">'
+            f'<span class="property-card__title">{p.title}</span>'
+            f'<span class="property-card__address">{p.address}</span></h2>'
+            f'<ul class="property-card__details">{details}</ul>'
+            '<div class="property-card__price js-property-card-prices">'
+            f'<p>{brl(p.price)}</p></div></a></article>'
+        )
+
+    def listing(self, path: str, query: Dict[str, str]) -> bytes:
+        found = self.search(path, query)
+        page = max(int(query.get('pagina', 1) or 1), 1)
+        first = (page - 1) * PAGE_SIZE
+        cards = ''.join(
+            self.card(p) for p in found[first:first + PAGE_SIZE]
+        )
+        pages = ''.join(
+            f'<button class="js-change-page" data-page="{n}"'
+            f'{" data-active" if n == page else ""}>{n}</button>'
+            for n in range(max(page - 2, 1), page + 3)
+        )
+        count = f'{len(found):,}'.replace(',', '.')
+        return self.page(
+            '<div class="results-summary__data">'
+            f'<strong class="results-summary__count">{count}</strong>'
+            f' Imóveis</div><section class="results-list">{cards}</section>'
+            f'<div class="js-results-pagination">{pages}</div>'
+        )
+
+    @staticmethod
+    def state(p: Listing) -> dict:
+        """The listing as the portal embeds it in `__INITIAL_STATE__`."""
+        pricing = {
+            'businessType': (
+                'RENTAL' if p.house_type == FlagHouseType.HENT else 'SALE'
+            ),
+            'price': str(p.price),
+        }
+        if p.condo_fee:
+            pricing['monthlyCondoFee'] = str(p.condo_fee)
+        created = PUBLISHED_BASE - timedelta(days=p.published_days)
+        return {'listing': {'listing': {
+            'id': str(p.id),
+            'title': p.title,
+            'description': f'{p.title} em {p.address}.',
+            'createdAt': created.isoformat(),
+            'unitTypes': [p.property_type.name],
+            'usableAreas': [p.area],
+            'bedrooms': [p.rooms],
+            'bathrooms': [p.bathrooms],
+            'parkingSpaces': [p.parking_spaces],
+            'pricingInfos': [pricing],
+            'address': {
+                'street': p.street,
+                'streetNumber': str(p.number),
+                'neighborhood': p.neighborhood,
+                'city': 'São Paulo',
+                'stateAcronym': 'SP',
+                'zone': str(p.region),
+            },
+            'medias': [
+                {'type': 'IMAGE', 'url': url} for url in p.photos
+            ],
+        }}}
+
+    def detail(self, p: Listing, embed_state: bool = True) -> bytes:
+        business = 'Aluguel' if p.house_type == FlagHouseType.HENT else 'Venda'
+        fees = (
+            f'<p class="additional-price-info--value">{brl(p.condo_fee)}</p>'
+            if p.condo_fee
+            else ''
+        )
+        photos = ''.join(
+            '<li class="carousel-photos--item">'
+            f'<img srcset="{url}"></li>'
+            for url in p.photos
+        )
+        amenities = ''.join(
+            f'<p class="amenities-item">{amenity_text(value, unit)}</p>'
+            for value, unit in (
+                (p.area, 'm²'),
+                (p.rooms, 'quarto'),
+                (p.bathrooms, 'banheiro'),
+                (p.parking_spaces, 'vaga'),
+            )
+        )
+        state = (
+            '<script>window.__INITIAL_STATE__ = '
+            f'{json.dumps(self.state(p), ensure_ascii=False)};</script>'
+            if embed_state
+            else ''
+        )
+        return self.page(
+            f'<h1 class="description__title">{p.title}</h1>'
+            '<div class="price-value-wrapper">'
+            f'<p id="business-type-info">{business}</p></div>'
+            f'<p class="price-info-value">{brl(p.price)}</p>{fees}'
+            f'<p class="address-info-value">{p.address}</p>'
+            f'<ul class="amenities-list">{amenities}</ul>'
+            '<div class="desktop-only-container">'
+            f'<p class="description__content--text">{p.title} em '
+            f'{p.address}.</p><span class="description__created-at">'
+            f'Publicado há {p.published_days} dias</span></div>'
+            f'<ul class="carousel-photos">{photos}</ul>{state}'
+        )
+
+
+class Throttle:
+    """Thread-safe token bucket; `allow` is False when over the rate."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = max(rate, 1.0)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                max(self.rate, 1.0),
+                self.tokens + (now - self.updated) * self.rate,
+            )
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class PortalServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: PortalConfig = None):
+        self.config = config or PortalConfig()
+        recorded, head = load_trace(self.config.trace_path)
+        self.recorded = recorded
+        self.catalogue = Catalogue(
+            make_listings(self.config.listings, self.config.seed),
+            head if self.config.shell else '',
+        )
+        self.replay = None
+        if self.config.replay_path:
+            self.replay = ResponseCache(self.config.replay_path, ttl={})
+        self.throttle = None
+        if self.config.max_requests_per_second:
+            self.throttle = Throttle(self.config.max_requests_per_second)
+        self.random = random.Random(self.config.seed)
+        self.requests: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        super().__init__((self.config.host, self.config.port), PortalHandler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, status: int):
+        with self._lock:
+            self.requests[status] = self.requests.get(status, 0) + 1
+
+    def fault(self) -> Union[int, None]:
+        cfg = self.config
+        if self.throttle and not self.throttle.allow():
+            return 429
+        with self._lock:
+            roll = self.random.random()
+        if roll < cfg.throttle_rate:
+            return 429
+        if roll < cfg.throttle_rate + cfg.error_rate:
+            return 503
+        return None
+
+    def delay(self) -> float:
+        with self._lock:
+            jitter = self.random.uniform(-1, 1) * self.config.jitter
+        return max(self.config.latency + jitter, 0.0)
+
+    def respond(self, target: str) -> Response:
+        url = urlsplit(target)
+        if self.replay:
+            kind = 'detail' if DETAIL_PATH.match(url.path) else 'listing'
+            hit = self.replay.get(
+                urljoin(PORTAL_ORIGIN, target), kind, offline=True
+            )
+            if hit:
+                return hit.status_code, 'text/html', hit.text.encode()
+        if target in self.recorded:
+            return self.recorded[target]
+        detail = DETAIL_PATH.match(url.path)
+        if detail:
+            p = self.catalogue.by_id.get(int(detail.group(1)))
+            if p:
+                return 200, 'text/html', self.catalogue.detail(
+                    p, self.config.embed_state
+                )
+        elif url.path.strip('/').split('/')[0] in {
+            str(t) for t in FlagHouseType
+        }:
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            return 200, 'text/html', self.catalogue.listing(url.path, query)
+        return 404, 'text/html', self.catalogue.page('Not Found')
+
+    def start(self) -> 'PortalServer':
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info(f'[PORTAL] => serving on {self.url}')
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> 'PortalServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class PortalHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: PortalServer
+
+    def do_GET(self):
+        time.sleep(self.server.delay())
+        status = self.server.fault()
+        if status:
+            content_type, body = 'text/plain', b'injected'
+        else:
+            status, content_type, body = self.server.respond(self.path)
+        self.server.count(status)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type or 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(config: PortalConfig = None):
+    server = PortalServer(config)
+    logger.info(
+        f'[PORTAL] => {server.url} ({len(server.recorded)} recorded, '
+        f'{len(server.catalogue.listings)} synthetic)'
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f'[PORTAL] <= {server.requests}')
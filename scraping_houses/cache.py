@@ -0,0 +1,246 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from scraping_houses.utils import logger
+
+# query parameters that never change the page we get back
+IGNORED_PARAMS = ('utm_', 'gclid', 'fbclid')
+
+
+def canonical_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.startswith(IGNORED_PARAMS)
+    )
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path or '/',
+        urlencode(query, safe=',:'),
+        '',
+    ))
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    text: str
+    status_code: int = 200
+    reason: str = 'OK'
+    local_ip: str = 'cache'
+    primary_ip: str = 'cache'
+    from_cache: bool = True
+
+    def __str__(self) -> str:
+        return f'<CachedResponse [{self.status_code}] {self.url}>'
+
+
+class ResponseCache:
+    """Compressed, content-addressed response cache on disk.
+
+    Bodies are stored once per content hash under `blobs/`; a small
+    SQLite index maps the canonical url to its blob, status and age.
+    Entries expire per kind (`ttl`, seconds) and the least recently used
+    ones are evicted once the blobs outgrow `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ttl: Dict[str, int],
+        max_bytes: int = 1 << 30,
+    ):
+        self.path = Path(path)
+        self.blobs = self.path / 'blobs'
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.path / 'index.sqlite', check_same_thread=False
+        )
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY, url TEXT, kind TEXT, blob TEXT,'
+            ' size INTEGER, status_code INTEGER, reason TEXT,'
+            ' stored_at REAL, accessed_at REAL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS ix_entries_accessed_at'
+            ' ON entries (accessed_at)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS ix_entries_blob ON entries (blob)'
+        )
+        self._db.commit()
+        # running byte total of the blobs, so a put never rescans them
+        self._size = self._disk_size()
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(canonical_url(url).encode()).hexdigest()
+
+    def _blob_path(self, blob: str) -> Path:
+        return self.blobs / blob[:2] / blob
+
+    def get(
+        self,
+        url: str,
+        kind: str,
+        offline: bool = False,
+    ) -> Union[CachedResponse, None]:
+        """Cached response for `url`; offline ignores the ttl."""
+        key = self.key(url)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT blob, status_code, reason, stored_at'
+                ' FROM entries WHERE key = ?',
+                (key,),
+            ).fetchone()
+        if not row:
+            return None
+        blob, status_code, reason, stored_at = row
+        if not offline and time.time() - stored_at > self.ttl[kind]:
+            return None
+        # read and inflate outside the lock, hits don't wait on each other
+        try:
+            body = zlib.decompress(self._blob_path(blob).read_bytes())
+        except (OSError, zlib.error) as e:
+            logger.warning(f'[CACHE] {url} {e}')
+            with self._lock:
+                self._drop(key)
+                self._db.commit()
+            return None
+        with self._lock:
+            self._db.execute(
+                'UPDATE entries SET accessed_at = ? WHERE key = ?',
+                (time.time(), key),
+            )
+            self._db.commit()
+        return CachedResponse(
+            url=url,
+            text=body.decode(),
+            status_code=status_code,
+            reason=reason,
+        )
+
+    def put(self, url: str, kind: str, response):
+        body = response.text.encode()
+        blob = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(blob)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_bytes(zlib.compress(body, 6))
+            os.replace(tmp, path)
+        size = path.stat().st_size
+        key = self.key(url)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute(
+                'SELECT blob FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if old and old[0] == blob:
+                self._db.execute(
+                    'UPDATE entries SET kind = ?, status_code = ?,'
+                    ' reason = ?, stored_at = ?, accessed_at = ?'
+                    ' WHERE key = ?',
+                    (
+                        kind,
+                        response.status_code,
+                        response.reason,
+                        now,
+                        now,
+                        key,
+                    ),
+                )
+            else:
+                if old:
+                    self._drop(key)
+                if not self._shared(blob):
+                    self._size += size
+                self._db.execute(
+                    'INSERT INTO entries VALUES (?,?,?,?,?,?,?,?,?)',
+                    (
+                        key,
+                        canonical_url(url),
+                        kind,
+                        blob,
+                        size,
+                        response.status_code,
+                        response.reason,
+                        now,
+                        now,
+                    ),
+                )
+            self._db.commit()
+        self.evict()
+
+    def urls(self, kind: str = None) -> List[str]:
+        query = 'SELECT url FROM entries'
+        args = ()
+        if kind:
+            query, args = query + ' WHERE kind = ?', (kind,)
+        with self._lock:
+            return [url for url, in self._db.execute(query, args)]
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _disk_size(self) -> int:
+        # a blob shared by many urls only takes disk space once
+        return self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM'
+            ' (SELECT size FROM entries GROUP BY blob)'
+        ).fetchone()[0]
+
+    def _shared(self, blob: str) -> bool:
+        return self._db.execute(
+            'SELECT 1 FROM entries WHERE blob = ? LIMIT 1', (blob,)
+        ).fetchone() is not None
+
+    def _drop(self, key: str):
+        """Delete an entry, and its blob once nothing else points to it.
+
+        Called with the lock held; the caller commits.
+        """
+        row = self._db.execute(
+            'SELECT blob, size FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if not row:
+            return
+        blob, size = row
+        self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+        if not self._shared(blob):
+            self._blob_path(blob).unlink(missing_ok=True)
+            self._size -= size
+
+    def evict(self):
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return
+            # other processes may share the directory: recount once
+            # before evicting, not on every put
+            self._size = self._disk_size()
+            if self._size <= self.max_bytes:
+                return
+            target = self.max_bytes * 0.9
+            for key, in self._db.execute(
+                'SELECT key FROM entries ORDER BY accessed_at'
+            ).fetchall():
+                self._drop(key)
+                if self._size <= target:
+                    break
+            self._db.commit()
@@ -0,0 +1,50 @@
+from typing import Union
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from scraping_houses.models import TableCrawlCheckpoint
+from scraping_houses.schemas import CrawlCheckpoint
+
+
+def load_checkpoint(
+    session: Session,
+    config_hash: str,
+) -> Union[CrawlCheckpoint, None]:
+    row = session.scalar(
+        select(TableCrawlCheckpoint).filter_by(config_hash=config_hash)
+    )
+    if not row:
+        return None
+    return CrawlCheckpoint(
+        config_hash=row.config_hash,
+        total_properties=row.total_properties,
+        last_page=row.last_page,
+    )
+
+
+def save_checkpoint(session: Session, checkpoint: CrawlCheckpoint):
+    """Write the whole checkpoint in one transaction."""
+    cp = checkpoint
+    row = session.scalar(
+        select(TableCrawlCheckpoint).filter_by(config_hash=cp.config_hash)
+    )
+    if not row:
+        row = TableCrawlCheckpoint(
+            config_hash=cp.config_hash,
+            total_properties=0,
+            last_page=0,
+        )
+        session.add(row)
+    row.total_properties = cp.total_properties
+    row.last_page = cp.last_page
+    session.commit()
+
+
+def delete_checkpoint(session: Session, config_hash: str):
+    row = session.scalar(
+        select(TableCrawlCheckpoint).filter_by(config_hash=config_hash)
+    )
+    if row:
+        session.delete(row)
+        session.commit()
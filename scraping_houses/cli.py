@@ -0,0 +1,197 @@
+import asyncio
+import os
+import sys
+
+# Adiciona o diretório pai ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from typing import List, Optional
+
+import typer
+
+from scraping_houses.schemas import (
+    CrawlConfig,
+    FlagHouseType,
+    FlagPropertyType,
+    FlagRegion,
+    PortalConfig,
+    UrlConfig,
+    settings,
+)
+
+app = typer.Typer()
+
+
+@app.callback()
+def callback():
+    """Scraping houses."""
+
+
+@app.command()
+def crawl(
+    house_type: FlagHouseType = FlagHouseType.HENT,
+    region: Optional[FlagRegion] = None,
+    property_type: Optional[List[FlagPropertyType]] = None,
+    rooms: int = 0,
+    min_price: int = 0,
+    max_price: int = 0,
+    workers: int = typer.Option(1, help='Processes; >1 shards the crawl.'),
+    concurrency: int = CrawlConfig().concurrency,
+    shard_price_bands: bool = False,
+    recrawl: bool = typer.Option(
+        False, help='Refresh known properties that are due (one process).'
+    ),
+    cards_only: bool = typer.Option(
+        False, help='Store cards, fetch changed details (one process).'
+    ),
+    cards_fetch_new: bool = typer.Option(
+        False, help='With --cards-only, also fetch unseen properties.'
+    ),
+    cache: bool = typer.Option(False, help='Cache responses on disk.'),
+    offline: bool = typer.Option(
+        False, help='Replay from the response cache only.'
+    ),
+    url_base: str = typer.Option(
+        settings.URL_VIVAREAL, help='Portal to crawl, e.g. a local stand-in.'
+    ),
+):
+    from scraping_houses.scrapings.pool import crawl_pool
+    from scraping_houses.scrapings.vivareal import ScrapingVivalreal
+
+    url_cfg = UrlConfig(
+        url_base=url_base,
+        house_type=house_type,
+        region=region,
+        property_type=property_type or None,
+        rooms=rooms,
+        min_price=min_price,
+        max_price=max_price,
+    )
+    crawl_cfg = CrawlConfig(
+        concurrency=concurrency,
+        shard_price_bands=shard_price_bands,
+        recrawl=recrawl,
+        cards_only=cards_only,
+        cards_fetch_new=cards_fetch_new,
+        cache=cache,
+        offline=offline,
+    )
+    if workers > 1 and not (recrawl or cards_only):
+        crawl_pool(url_cfg, crawl_cfg, workers)
+    else:
+        asyncio.run(ScrapingVivalreal(url_cfg, crawl_cfg).run())
+
+
+@app.command()
+def portal(
+    port: int = PortalConfig().port,
+    listings: int = PortalConfig().listings,
+    seed: int = 0,
+    latency: float = typer.Option(0.0, help='Seconds added per request.'),
+    jitter: float = 0.0,
+    error_rate: float = typer.Option(0.0, help='Share of 503 responses.'),
+    throttle_rate: float = typer.Option(0.0, help='Share of 429 responses.'),
+    max_requests_per_second: float = typer.Option(
+        0.0, help='Answer 429 above this rate.'
+    ),
+    replay: str = typer.Option(
+        '', help='Response cache recorded with `crawl --cache` to replay.'
+    ),
+):
+    """Serve a local stand-in of the portal for benchmarks."""
+    from scraping_houses.benchmarks.portal import serve
+
+    serve(PortalConfig(
+        port=port,
+        listings=listings,
+        seed=seed,
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        throttle_rate=throttle_rate,
+        max_requests_per_second=max_requests_per_second,
+        replay_path=replay,
+    ))
+
+
+@app.command()
+def benchmark(
+    output: str = typer.Option('benchmark.json', help='JSON results file.'),
+    house_type: FlagHouseType = FlagHouseType.HENT,
+    listings: int = 3000,
+    latency: float = 0.02,
+    jitter: float = 0.01,
+    error_rate: float = 0.0,
+    throttle_rate: float = 0.0,
+    concurrency: int = CrawlConfig().concurrency,
+    host_max_in_flight: int = 16,
+    rate: float = typer.Option(200.0, help='Requests/s per host.'),
+    parse_workers: int = CrawlConfig().parse_workers,
+    parse_threads: int = CrawlConfig().parse_threads,
+):
+    """Crawl a local stand-in portal and write throughput metrics."""
+    from scraping_houses.benchmarks.crawl import run_benchmark
+
+    run_benchmark(
+        PortalConfig(
+            listings=listings,
+            latency=latency,
+            jitter=jitter,
+            error_rate=error_rate,
+            throttle_rate=throttle_rate,
+        ),
+        UrlConfig(house_type=house_type),
+        CrawlConfig(
+            concurrency=concurrency,
+            host_max_in_flight=host_max_in_flight,
+            host_requests_per_second=rate,
+            host_max_rate=rate,
+            host_burst=host_max_in_flight,
+            parse_workers=parse_workers,
+            parse_threads=parse_threads,
+            resume=False,
+        ),
+        output,
+    )
+
+
+@app.command()
+def benchmark_parser(
+    fixtures: str = typer.Option(
+        'benchmarks/fixtures', help='Saved pages; seeded when empty.'
+    ),
+    output: str = typer.Option('benchmark-parser.json'),
+    repeat: int = 5,
+    cache: str = typer.Option('', help='Also use pages from this cache.'),
+):
+    """Time the listing and detail parsers over saved pages."""
+    from scraping_houses.benchmarks.parser import run_parser_benchmark
+
+    run_parser_benchmark(fixtures, output, repeat, cache)
+
+
+@app.command()
+def history(property_id: int):
+    """Show what changed on a listing, observation by observation."""
+    from rich.table import Table
+    from sqlalchemy.orm import Session
+
+    from scraping_houses.database import get_engine
+    from scraping_houses.history import timeline
+    from scraping_houses.utils import cl
+
+    table = Table(title=f'Property {property_id}')
+    for column in ('observed at', 'field', 'value'):
+        table.add_column(column)
+    with Session(get_engine()) as session:
+        for row in timeline(session, property_id):
+            for n, (field, value) in enumerate(sorted(row.changes.items())):
+                table.add_row(
+                    f'{row.observed_at:%Y-%m-%d %H:%M}' if n == 0 else '',
+                    field,
+                    str(value),
+                )
+    cl.print(table)
+
+
+if __name__ == '__main__':
+    app()
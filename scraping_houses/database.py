@@ -1,11 +1,68 @@
-from sqlalchemy import create_engine
+from functools import lru_cache
+from typing import Dict, Union
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import Session
 
 from scraping_houses.settings import Settings
 
-engine = create_engine(Settings().DATABASE_URL)
+
+def sqlite_pragmas(settings: Settings) -> Dict[str, Union[str, int]]:
+    return {
+        'journal_mode': settings.SQLITE_JOURNAL_MODE,
+        'synchronous': settings.SQLITE_SYNCHRONOUS,
+        'busy_timeout': settings.SQLITE_BUSY_TIMEOUT,
+        'mmap_size': settings.SQLITE_MMAP_SIZE,
+        'cache_size': settings.SQLITE_CACHE_SIZE,
+    }
+
+
+def create_db_engine(
+    url: str = None,
+    settings: Settings = None,
+    **options,
+) -> Engine:
+    """An engine tuned for the backend of `url`.
+
+    SQLite connections get the pragmas from settings on connect (WAL,
+    busy timeout, synchronous, mmap and cache size); other backends get
+    a pre-pinged, recycled connection pool.
+    """
+    settings = settings or Settings()
+    url = make_url(url or settings.DATABASE_URL)
+    if url.get_backend_name() != 'sqlite':
+        options.setdefault('pool_size', settings.DATABASE_POOL_SIZE)
+        options.setdefault('max_overflow', settings.DATABASE_MAX_OVERFLOW)
+        options.setdefault('pool_recycle', settings.DATABASE_POOL_RECYCLE)
+        options.setdefault('pool_pre_ping', True)
+        return create_engine(url, **options)
+
+    engine = create_engine(url, **options)
+    pragmas = sqlite_pragmas(settings)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    return engine
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    return create_db_engine()
+
+
+def __getattr__(name: str):
+    # `engine` is created on first use, not when the module is imported
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         yield session
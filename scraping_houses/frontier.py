@@ -0,0 +1,225 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+from uuid import uuid4
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from scraping_houses.models import TableFrontier
+from scraping_houses.schemas import PROPERTY_ID
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# higher is claimed first
+PRIORITY_NEW = 30
+PRIORITY_CHANGED = 20
+PRIORITY_REFRESH = 10
+
+CHUNK_SIZE = 500
+
+# lease owner prefix of urls waiting on another process's writer
+HANDED_OFF = 'handed-off'
+
+
+def chunks(items: List, size: int = CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class Frontier:
+    """Durable crawl frontier in the database.
+
+    A listing is one row whatever slug its url was pushed under: rows
+    are keyed by the property id in the url, or by the url without one.
+    Urls are claimed in batches under a lease: a claim marks up to `n`
+    pending (or lease-expired) rows with a unique token in a single
+    UPDATE, so concurrent workers, even in other processes, never get
+    the same url. Leases that are not completed or released expire and
+    go back to the pool.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        lease_seconds: int = 600,
+        max_retries: int = 3,
+        owner: str = None,
+    ):
+        self.engine = engine
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_retries = max_retries
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}'
+
+    def _insert(self):
+        if self.engine.dialect.name == 'postgresql':
+            return postgresql.insert(TableFrontier)
+        return sqlite.insert(TableFrontier)
+
+    def _upsert(self, key: str, requeue: bool):
+        stmt = self._insert()
+        if requeue:
+            # the pushed url is the listing's latest slug
+            return stmt.on_conflict_do_update(
+                index_elements=[key],
+                set_={
+                    'url': stmt.excluded.url,
+                    'state': PENDING,
+                    'priority': stmt.excluded.priority,
+                    'retries': 0,
+                },
+                where=TableFrontier.state != LEASED,
+            )
+        # only ever raise the priority of work still waiting, and give
+        # urls that ran out of retries another round
+        return stmt.on_conflict_do_update(
+            index_elements=[key],
+            set_={
+                'state': PENDING,
+                'priority': stmt.excluded.priority,
+                'retries': case(
+                    (TableFrontier.state == FAILED, 0),
+                    else_=TableFrontier.retries,
+                ),
+            },
+            where=or_(
+                TableFrontier.state == FAILED,
+                and_(
+                    TableFrontier.state == PENDING,
+                    TableFrontier.priority < stmt.excluded.priority,
+                ),
+            ),
+        )
+
+    def push(
+        self,
+        urls: Iterable[str],
+        priority: int = PRIORITY_NEW,
+        kind: str = 'detail',
+        requeue: bool = False,
+    ) -> int:
+        """Add urls; failed ones are pending again, with `requeue` done
+        ones too.
+        """
+        rows = {}
+        for url in urls:
+            match = PROPERTY_ID.search(url)
+            property_id = int(match.group(1)) if match else None
+            rows.setdefault(url if property_id is None else property_id, {
+                'url': url,
+                'kind': kind,
+                'priority': priority,
+                'state': PENDING,
+                'retries': 0,
+                'property_id': property_id,
+            })
+        listings = [r for r in rows.values() if r['property_id'] is not None]
+        others = [r for r in rows.values() if r['property_id'] is None]
+        with Session(self.engine) as session:
+            for key, batch in (('property_id', listings), ('url', others)):
+                stmt = self._upsert(key, requeue)
+                for chunk in chunks(batch):
+                    session.execute(stmt, chunk)
+            session.commit()
+        return len(rows)
+
+    def claim(self, n: int, kind: str = 'detail') -> List[str]:
+        token = f'{self.owner}:{uuid4().hex}'
+        now = datetime.now()
+        claimable = (
+            select(TableFrontier.id)
+            .where(
+                TableFrontier.kind == kind,
+                or_(
+                    TableFrontier.state == PENDING,
+                    and_(
+                        TableFrontier.state == LEASED,
+                        TableFrontier.lease_expires_at < now,
+                    ),
+                ),
+            )
+            .order_by(TableFrontier.priority.desc(), TableFrontier.id)
+            .limit(n)
+        )
+        if self.engine.dialect.name == 'postgresql':
+            claimable = claimable.with_for_update(skip_locked=True)
+        with Session(self.engine) as session:
+            session.execute(
+                update(TableFrontier)
+                .where(TableFrontier.id.in_(claimable))
+                .values(
+                    state=LEASED,
+                    lease_owner=token,
+                    lease_expires_at=now + self.lease,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            urls = session.scalars(
+                select(TableFrontier.url)
+                .filter_by(lease_owner=token)
+                .order_by(TableFrontier.priority.desc(), TableFrontier.id)
+            ).all()
+            session.commit()
+        return list(urls)
+
+    def _update(self, urls: Iterable[str], **values):
+        with Session(self.engine) as session:
+            for chunk in chunks(list(urls)):
+                session.execute(
+                    update(TableFrontier)
+                    .where(TableFrontier.url.in_(chunk))
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+            session.commit()
+
+    def hand_off(self, urls: Iterable[str]):
+        """Keep the leases on `urls` out of `release`.
+
+        For urls sent to a writer that completes or fails them; if it
+        never does, the lease still expires.
+        """
+        self._update(urls, lease_owner=f'{HANDED_OFF}:{self.owner}')
+
+    def complete(self, urls: Iterable[str]):
+        self._update(urls, state=DONE, lease_owner=None)
+
+    def fail(self, urls: Iterable[str]):
+        self._update(
+            urls,
+            retries=TableFrontier.retries + 1,
+            state=case(
+                (TableFrontier.retries + 1 >= self.max_retries, FAILED),
+                else_=PENDING,
+            ),
+            lease_owner=None,
+        )
+
+    def release(self):
+        """Give back every url this owner still holds a lease on."""
+        with Session(self.engine) as session:
+            session.execute(
+                update(TableFrontier)
+                .where(
+                    TableFrontier.state == LEASED,
+                    TableFrontier.lease_owner.startswith(f'{self.owner}:'),
+                )
+                .values(state=PENDING, lease_owner=None)
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+
+    def remaining(self, kind: str = 'detail') -> Dict[str, int]:
+        with Session(self.engine) as session:
+            rows = session.execute(
+                select(TableFrontier.state, func.count())
+                .filter_by(kind=kind)
+                .group_by(TableFrontier.state)
+            ).all()
+        return dict(rows)
@@ -0,0 +1,149 @@
+"""Delta-only history of listing changes.
+
+`properties` is the materialized current state; `property_history`
+holds, per observation that changed something, only the fields that
+changed. A listing's first observation stores every field, so state at
+any time is the fold of its rows up to then, and storage grows with
+the number of changes, not of crawls.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from scraping_houses.models import TablePropertyHistory
+from scraping_houses.recrawl import FINGERPRINT_FIELDS
+
+HISTORY_FIELDS = (
+    *FINGERPRINT_FIELDS,
+    'price_cents',
+    'condo_fee_cents',
+    'area_m2',
+    'bedrooms',
+    'bathrooms',
+    'parking_spaces',
+)
+
+
+def diff(
+    old,
+    new,
+    fields: Sequence[str] = HISTORY_FIELDS,
+) -> Dict[str, Any]:
+    """Fields of `new` that differ from `old`; without `old`, the set ones."""
+    if old is None:
+        return {
+            f: getattr(new, f) for f in fields
+            if getattr(new, f) not in (None, '', [])
+        }
+    return {
+        f: getattr(new, f) for f in fields
+        if getattr(old, f) != getattr(new, f)
+    }
+
+
+def observation(
+    property_id: int,
+    observed_at: datetime,
+    changes: Dict[str, Any],
+    region: str = None,
+) -> Dict[str, Any]:
+    return {
+        'property_id': property_id,
+        'observed_at': observed_at,
+        'changes': changes,
+        'region': region,
+        'price_cents': changes.get('price_cents'),
+    }
+
+
+def record(session: Session, observations: List[Dict[str, Any]]):
+    """Insert a batch of observations in one executemany."""
+    if observations:
+        session.execute(insert(TablePropertyHistory), observations)
+
+
+def timeline(
+    session: Session,
+    property_id: int,
+) -> List[TablePropertyHistory]:
+    return list(session.scalars(
+        select(TablePropertyHistory)
+        .filter_by(property_id=property_id)
+        .order_by(TablePropertyHistory.observed_at, TablePropertyHistory.id)
+    ))
+
+
+def state_at(
+    session: Session,
+    property_id: int,
+    when: datetime,
+) -> Dict[str, Any]:
+    """The listing's fields as they were at `when`."""
+    state = {}
+    for row in session.scalars(
+        select(TablePropertyHistory.changes)
+        .where(
+            TablePropertyHistory.property_id == property_id,
+            TablePropertyHistory.observed_at <= when,
+        )
+        .order_by(TablePropertyHistory.observed_at, TablePropertyHistory.id)
+    ):
+        state.update(row)
+    return state
+
+
+def price_history(
+    session: Session,
+    property_id: int,
+) -> List[Tuple[datetime, int]]:
+    """(observed_at, price_cents) for every price the listing had."""
+    return [
+        tuple(row) for row in session.execute(
+            select(
+                TablePropertyHistory.observed_at,
+                TablePropertyHistory.price_cents,
+            )
+            .where(
+                TablePropertyHistory.property_id == property_id,
+                TablePropertyHistory.price_cents.is_not(None),
+            )
+            .order_by(TablePropertyHistory.observed_at)
+        )
+    ]
+
+
+def region_price_series(
+    session: Session,
+    region: str,
+    since: datetime = None,
+    until: datetime = None,
+) -> List[Tuple[str, int, int]]:
+    """(day, listings, mean price cents) of the prices set each day.
+
+    A scan of `ix_property_history_region` over the window.
+    """
+    day = func.date(TablePropertyHistory.observed_at)
+    stmt = (
+        select(
+            day,
+            func.count(TablePropertyHistory.id),
+            func.avg(TablePropertyHistory.price_cents),
+        )
+        .where(
+            TablePropertyHistory.region == str(region),
+            TablePropertyHistory.price_cents.is_not(None),
+        )
+        .group_by(day)
+        .order_by(day)
+    )
+    if since is not None:
+        stmt = stmt.where(TablePropertyHistory.observed_at >= since)
+    if until is not None:
+        stmt = stmt.where(TablePropertyHistory.observed_at < until)
+    return [
+        (str(d), count, round(mean))
+        for d, count, mean in session.execute(stmt)
+    ]
@@ -0,0 +1,272 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from scraping_houses.frontier import CHUNK_SIZE, chunks
+from scraping_houses.history import HISTORY_FIELDS, diff, observation, record
+from scraping_houses.models import TableProperty
+from scraping_houses.normalize import TYPED_FIELDS, normalize_property
+from scraping_houses.recrawl import (
+    CARD_FINGERPRINT_FIELDS,
+    card_fingerprint,
+    fingerprint,
+    next_interval,
+)
+from scraping_houses.schemas import IngestResult, Property
+
+# what a detail page sets on its row
+UPDATE_FIELDS = (
+    'status_code',
+    'reason',
+    'local_ip',
+    'primary_ip',
+    'title',
+    'property_type',
+    'price',
+    'additional_price',
+    'address',
+    'properties',
+    'description',
+    'images',
+    'published_at',
+    *TYPED_FIELDS,
+    'region',
+)
+# the change detection and recrawl schedule, worked out before the write
+SCHEDULE_FIELDS = (
+    'fingerprint',
+    'last_checked_at',
+    'last_changed_at',
+    'next_check_at',
+    'check_interval',
+    'change_count',
+)
+# typed columns a card's price and amenities give
+CARD_TYPED_FIELDS = (
+    'price_cents',
+    'area_m2',
+    'bedrooms',
+    'bathrooms',
+    'parking_spaces',
+)
+# what a card sets on a new row
+CARD_FIELDS = tuple(
+    f for f in UPDATE_FIELDS
+    if f not in TYPED_FIELDS or f in CARD_TYPED_FIELDS
+)
+# what a card says about a listing's history
+CARD_HISTORY_FIELDS = tuple(
+    f for f in HISTORY_FIELDS
+    if f in CARD_FINGERPRINT_FIELDS + CARD_TYPED_FIELDS
+)
+DEFAULT_INTERVAL = TableProperty.__table__.c.check_interval.default.arg
+
+
+def property_row(
+    property: Property,
+    fields: Sequence[str] = UPDATE_FIELDS,
+) -> Dict:
+    """The columns of `property`'s row, keyed by its listing id."""
+    return {
+        'url': property.url,
+        'property_id': property.property_id,
+        **{field: getattr(property, field) for field in fields},
+    }
+
+
+def upsert_statement(session: Session):
+    """INSERT ... ON CONFLICT(property_id) DO UPDATE for the dialect.
+
+    Rows whose fingerprint did not move keep their stored values, so
+    an unchanged listing only moves its recrawl schedule.
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        stmt = postgresql.insert(TableProperty)
+    else:
+        stmt = sqlite.insert(TableProperty)
+    columns = TableProperty.__table__.c
+    unchanged = columns.fingerprint == stmt.excluded.fingerprint
+    new = {field: stmt.excluded[field] for field in UPDATE_FIELDS}
+    # a page without the zone keeps the one its card gave
+    new['region'] = func.coalesce(new['region'], columns.region)
+    return stmt.on_conflict_do_update(
+        index_elements=['property_id'],
+        set_={
+            # the slug may change, the id does not
+            'url': stmt.excluded.url,
+            **{
+                field: case((unchanged, columns[field]), else_=value)
+                for field, value in new.items()
+            },
+            **{field: stmt.excluded[field] for field in SCHEDULE_FIELDS},
+        },
+    )
+
+
+def upsert_properties(
+    session: Session,
+    properties: Iterable[Property],
+    now: datetime = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> IngestResult:
+    """Insert or update properties in chunks of one upsert each.
+
+    A chunk costs one SELECT of the stored fingerprints, schedules and
+    tracked fields, one executemany, and one more for the history of
+    what changed, whatever its size. A property repeated in the
+    batch, under any url, is written once with its last value; one
+    without an id in its url is skipped. The caller commits.
+    """
+    now = now or datetime.now()
+    # last one wins
+    batch = list({
+        p.property_id: p for p in properties if p.property_id is not None
+    }.values())
+    result = IngestResult()
+    if not batch:
+        return result
+    stmt = upsert_statement(session)
+    for chunk in chunks(batch, chunk_size):
+        known = {
+            row.property_id: row for row in session.execute(
+                select(
+                    TableProperty.property_id,
+                    TableProperty.fingerprint,
+                    TableProperty.check_interval,
+                    TableProperty.change_count,
+                    TableProperty.last_changed_at,
+                    TableProperty.region,
+                    *(getattr(TableProperty, f) for f in HISTORY_FIELDS),
+                ).where(
+                    TableProperty.property_id.in_(
+                        [p.property_id for p in chunk]
+                    )
+                )
+            )
+        }
+        rows, history = [], []
+        for p in chunk:
+            old = known.get(p.property_id)
+            row = schedule(old, p, now, result)
+            row.update(property_row(p))
+            rows.append(row)
+            if old is None or old.fingerprint != row['fingerprint']:
+                changes = diff(old, p)
+                if changes:
+                    region = p.region or (old.region if old else None)
+                    history.append(
+                        observation(p.property_id, now, changes, region)
+                    )
+        session.execute(stmt, rows)
+        record(session, history)
+    return result
+
+
+def upsert_cards(
+    session: Session,
+    cards: Iterable[Property],
+    now: datetime = None,
+) -> Tuple[List[str], List[str]]:
+    """Store listing cards; returns the (new, changed) urls.
+
+    A new listing gets a row from its card. A known one only takes the
+    card's typed columns, and its text too until a detail page filled
+    the row. A change of a card seen before asks for the detail page.
+    The caller commits.
+    """
+    now = now or datetime.now()
+    new, changed, history = [], [], []
+    cards = [p for p in cards if p.property_id is not None]
+    rows = {
+        row.property_id: row for row in session.scalars(
+            select(TableProperty).where(
+                TableProperty.property_id.in_([p.property_id for p in cards])
+            )
+        )
+    }
+    for p in cards:
+        normalize_property(p, now)
+        cfp = card_fingerprint(p)
+        row = rows.get(p.property_id)
+        if row is None:
+            row = TableProperty(
+                **property_row(p, CARD_FIELDS),
+                card_fingerprint=cfp,
+                last_checked_at=now,
+                last_changed_at=now,
+            )
+            session.add(row)
+            rows[p.property_id] = row
+            new.append(p.url)
+            changes = diff(None, p, CARD_HISTORY_FIELDS)
+        elif row.card_fingerprint != cfp:
+            if row.card_fingerprint is not None:
+                # the detail page recount decides what changed
+                changed.append(p.url)
+            # once a detail page filled the row its text stays: the
+            # card words it differently ('1 Quartos')
+            fields = CARD_TYPED_FIELDS
+            if row.fingerprint is None:
+                fields = CARD_FINGERPRINT_FIELDS + fields
+            # and the history only has what the row now holds
+            changes = diff(
+                row, p, [f for f in CARD_HISTORY_FIELDS if f in fields]
+            )
+            for field in fields:
+                setattr(row, field, getattr(p, field))
+            row.card_fingerprint = cfp
+        else:
+            changes = {}
+        row.url = p.url
+        row.region = p.region or row.region
+        row.last_checked_at = now
+        if changes:
+            history.append(
+                observation(p.property_id, now, changes, row.region)
+            )
+    record(session, history)
+    return new, changed
+
+
+def schedule(
+    known,
+    property: Property,
+    now: datetime,
+    result: IngestResult,
+) -> Dict:
+    """The schedule columns of one row, counted into `result`."""
+    fp = fingerprint(property)
+    if known is None:
+        result.inserted += 1
+        interval = timedelta(seconds=DEFAULT_INTERVAL)
+        change_count, last_changed_at = 0, now
+    elif known.fingerprint is None:
+        # first detail page of a property stored from its card
+        result.updated += 1
+        interval = timedelta(seconds=known.check_interval)
+        change_count = known.change_count
+        last_changed_at = known.last_changed_at
+    elif known.fingerprint == fp:
+        result.unchanged += 1
+        interval = next_interval(
+            timedelta(seconds=known.check_interval), changed=False
+        )
+        change_count = known.change_count
+        last_changed_at = known.last_changed_at
+    else:
+        result.updated += 1
+        interval = next_interval(
+            timedelta(seconds=known.check_interval), changed=True
+        )
+        change_count, last_changed_at = known.change_count + 1, now
+    return {
+        'fingerprint': fp,
+        'last_checked_at': now,
+        'last_changed_at': last_changed_at,
+        'next_check_at': now + interval,
+        'check_interval': int(interval.total_seconds()),
+        'change_count': change_count,
+    }
@@ -1,14 +1,18 @@
-from sqlalchemy import JSON, func
+from sqlalchemy import JSON, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, registry
 import re
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional
 
 table_registry = registry()
 
 @table_registry.mapped_as_dataclass
 class TableProperty:
     __tablename__ = 'properties'
+    # '2 quartos under R$ 3.000 in zona-sul' is one index range
+    __table_args__ = (
+        Index('ix_properties_search', 'region', 'bedrooms', 'price_cents'),
+    )
     
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     url: Mapped[str] = mapped_column(unique=True)
@@ -25,7 +29,33 @@ class TableProperty:
     description: Mapped[List[str]] = mapped_column(JSON)
     images: Mapped[List[str]] = mapped_column(JSON)
     published_at: Mapped[str]
-    property_id: Mapped[str]
+    property_id: Mapped[int] = mapped_column(unique=True, index=True)
+    # change detection for incremental recrawls
+    fingerprint: Mapped[Optional[str]] = mapped_column(default=None)
+    last_checked_at: Mapped[Optional[datetime]] = mapped_column(default=None)
+    last_changed_at: Mapped[Optional[datetime]] = mapped_column(default=None)
+    next_check_at: Mapped[Optional[datetime]] = mapped_column(
+        default=None, index=True
+    )
+    check_interval: Mapped[int] = mapped_column(
+        default=86400, server_default='86400'
+    )
+    change_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    # listing card as last seen, for crawls that skip detail pages
+    card_fingerprint: Mapped[Optional[str]] = mapped_column(default=None)
+    # typed values parsed from the text columns, for range queries
+    price_cents: Mapped[Optional[int]] = mapped_column(
+        default=None, index=True
+    )
+    condo_fee_cents: Mapped[Optional[int]] = mapped_column(default=None)
+    area_m2: Mapped[Optional[int]] = mapped_column(default=None, index=True)
+    bedrooms: Mapped[Optional[int]] = mapped_column(default=None)
+    bathrooms: Mapped[Optional[int]] = mapped_column(default=None)
+    parking_spaces: Mapped[Optional[int]] = mapped_column(default=None)
+    published_on: Mapped[Optional[datetime]] = mapped_column(
+        default=None, index=True
+    )
+    region: Mapped[Optional[str]] = mapped_column(default=None)
     created_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now()
     )
@@ -34,4 +64,75 @@ class TableProperty:
         return f'<TableProperty {self.property_id}>'
 
     def __str__(self):
-        return f'<Property {self.property_id}>'
\ No newline at end of file
+        return f'<Property {self.property_id}>'
+
+
+@table_registry.mapped_as_dataclass
+class TableCrawlCheckpoint:
+    __tablename__ = 'crawl_checkpoints'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    config_hash: Mapped[str] = mapped_column(unique=True)
+    total_properties: Mapped[int]
+    last_page: Mapped[int]
+    updated_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self):
+        return f'<TableCrawlCheckpoint {self.config_hash} {self.last_page}>'
+
+
+@table_registry.mapped_as_dataclass
+class TableFrontier:
+    __tablename__ = 'frontier'
+    __table_args__ = (
+        Index('ix_frontier_claim', 'kind', 'state', 'priority'),
+    )
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    url: Mapped[str] = mapped_column(unique=True)
+    kind: Mapped[str]
+    priority: Mapped[int]
+    state: Mapped[str]
+    # one row per listing, whatever slug it was pushed under
+    property_id: Mapped[Optional[int]] = mapped_column(
+        default=None, unique=True, index=True
+    )
+    retries: Mapped[int] = mapped_column(default=0)
+    lease_owner: Mapped[Optional[str]] = mapped_column(default=None)
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(
+        default=None
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self):
+        return f'<TableFrontier {self.state} {self.url}>'
+
+
+@table_registry.mapped_as_dataclass
+class TablePropertyHistory:
+    """What changed on a listing at one observation, and nothing else."""
+
+    __tablename__ = 'property_history'
+    __table_args__ = (
+        Index('ix_property_history_listing', 'property_id', 'observed_at'),
+        Index('ix_property_history_region', 'region', 'observed_at'),
+    )
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    property_id: Mapped[int]
+    observed_at: Mapped[datetime]
+    # field -> new value; the first observation holds every field
+    changes: Mapped[Dict[str, Any]] = mapped_column(JSON)
+    region: Mapped[Optional[str]] = mapped_column(default=None)
+    # the new price when it moved, for price series without the json
+    price_cents: Mapped[Optional[int]] = mapped_column(default=None)
+
+    def __repr__(self):
+        return (
+            f'<TablePropertyHistory {self.property_id} '
+            f'{self.observed_at:%Y-%m-%d %H:%M} {sorted(self.changes)}>'
+        )
@@ -0,0 +1,144 @@
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Union
+
+NUMBER = re.compile(r'\d[\d.]*(?:,\d+)?')
+# amenity text -> Property field, matched on the unit after the number
+AMENITIES = {
+    'm²': 'area_m2',
+    'quarto': 'bedrooms',
+    'banheiro': 'bathrooms',
+    'vaga': 'parking_spaces',
+}
+# 'Publicado há 3 dias' -> how far back one unit goes
+AGO = re.compile(r'há\s+(\d+|um|uma)\s+(\w+)')
+UNITS = {
+    'minuto': timedelta(minutes=1),
+    'hora': timedelta(hours=1),
+    'dia': timedelta(days=1),
+    'semana': timedelta(weeks=1),
+    'mês': timedelta(days=30),
+    'mese': timedelta(days=30),
+    'ano': timedelta(days=365),
+}
+# typed columns derived from the scraped text
+TYPED_FIELDS = (
+    'price_cents',
+    'condo_fee_cents',
+    *AMENITIES.values(),
+    'published_on',
+)
+
+
+def amenity_text(value: int, unit: str) -> str:
+    """The portal's wording: '1 quarto', '2 quartos', '60 m²'."""
+    if unit == 'm²':
+        return f'{value} m²'
+    return f'{value} {unit}{"" if value == 1 else "s"}'
+
+
+def to_int(number: str) -> int:
+    # '1.234,5' -> 1234, Brazilian thousands and decimal separators
+    return int(number.replace('.', '').partition(',')[0])
+
+
+def parse_money_cents(text: str) -> Union[int, None]:
+    """'R$ 2.500,50/mês' -> 250050; None when there is no amount."""
+    match = NUMBER.search(text or '')
+    if not match:
+        return None
+    units, _, cents = match.group().replace('.', '').partition(',')
+    return int(units) * 100 + int((cents + '00')[:2])
+
+
+def decimal_cents(value: Union[str, float, int]) -> int:
+    """1999.99 or '19.99' -> cents, cut like parse_money_cents, not float."""
+    return int(Decimal(str(value)) * 100)
+
+
+def parse_amenities(items: List[str]) -> Dict[str, int]:
+    """['60 m²', '2 quartos'] -> {'area_m2': 60, 'bedrooms': 2}."""
+    parsed = {}
+    for item in items:
+        text = item.lower()
+        match = NUMBER.search(text)
+        if not match:
+            continue
+        for unit, field in AMENITIES.items():
+            if unit in text[match.end():] and field not in parsed:
+                parsed[field] = to_int(match.group())
+                break
+    return parsed
+
+
+def parse_published_at(
+    text: str,
+    now: datetime = None,
+) -> Union[datetime, None]:
+    """'Publicado há 3 dias' or an ISO date -> when it was published.
+
+    Relative dates count back from `now`, the time the page was read.
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        published = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        pass
+    else:
+        if published.tzinfo:
+            published = published.astimezone().replace(tzinfo=None)
+        return published
+    now = now or datetime.now()
+    text = text.lower()
+    if 'hoje' in text:
+        return now
+    if 'ontem' in text:
+        return now - UNITS['dia']
+    match = AGO.search(text)
+    if not match:
+        return None
+    count, unit = match.groups()
+    count = 1 if count in {'um', 'uma'} else int(count)
+    # 'dias' -> 'dia', 'meses' -> 'mese'
+    step = UNITS.get(unit.rstrip('s')) or UNITS.get(unit)
+    return now - count * step if step else None
+
+
+def region_slug(zone: str) -> Union[str, None]:
+    """'Zona Sul' -> 'zona-sul', the FlagRegion value."""
+    text = unicodedata.normalize('NFKD', zone or '')
+    text = text.encode('ascii', 'ignore').decode().strip().lower()
+    return re.sub(r'[\s_]+', '-', text) or None
+
+
+def normalize_fields(
+    price: str,
+    additional_price: List[str],
+    properties: List[str],
+    published_at: str,
+    now: datetime = None,
+) -> Dict[str, Union[int, datetime, None]]:
+    """Every typed column from the scraped strings; None when missing."""
+    fields = dict.fromkeys(TYPED_FIELDS)
+    fields['price_cents'] = parse_money_cents(price)
+    if additional_price:
+        fields['condo_fee_cents'] = parse_money_cents(additional_price[0])
+    fields.update(parse_amenities(properties or []))
+    fields['published_on'] = parse_published_at(published_at, now)
+    return fields
+
+
+def normalize_property(property, now: datetime = None):
+    """Fill the typed fields a parser left empty, in place."""
+    p = property
+    fields = normalize_fields(
+        p.price, p.additional_price, p.properties, p.published_at, now
+    )
+    for field, value in fields.items():
+        if getattr(p, field) is None:
+            setattr(p, field, value)
+    return p
@@ -0,0 +1,91 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import List, Sequence
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from scraping_houses.models import TableProperty
+from scraping_houses.schemas import Property
+
+# fields that make a listing "different"; published_at is relative
+# ("Publicado há 3 dias") and changes every day on its own
+FINGERPRINT_FIELDS = (
+    'title',
+    'property_type',
+    'price',
+    'additional_price',
+    'address',
+    'properties',
+    'description',
+)
+
+# what a listing card shows; a change there asks for the detail page
+CARD_FINGERPRINT_FIELDS = ('title', 'address', 'price', 'properties')
+
+MIN_INTERVAL = timedelta(hours=12)
+MAX_INTERVAL = timedelta(days=30)
+
+
+def fingerprint(
+    property: Property,
+    fields: Sequence[str] = FINGERPRINT_FIELDS,
+) -> str:
+    data = {f: getattr(property, f) for f in fields}
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def card_fingerprint(property: Property) -> str:
+    return fingerprint(property, CARD_FINGERPRINT_FIELDS)
+
+
+def next_interval(interval: timedelta, changed: bool) -> timedelta:
+    """Check listings that change often more often, the rest less."""
+    interval = interval / 2 if changed else interval * 2
+    return max(MIN_INTERVAL, min(interval, MAX_INTERVAL))
+
+
+def due_urls(
+    session: Session,
+    now: datetime = None,
+    limit: int = None,
+) -> List[str]:
+    now = now or datetime.now()
+    stmt = (
+        select(TableProperty.url)
+        .where(
+            or_(
+                TableProperty.next_check_at.is_(None),
+                TableProperty.next_check_at <= now,
+            )
+        )
+        .order_by(TableProperty.next_check_at)
+        .limit(limit)
+    )
+    return list(session.scalars(stmt).all())
+
+
+def postpone(
+    session: Session,
+    property_ids: Sequence[int],
+    now: datetime = None,
+):
+    """Schedule the next check of listings whose page gave nothing.
+
+    The interval grows as if they had not changed, so a delisted page
+    is not fetched on every recrawl.
+    """
+    now = now or datetime.now()
+    for row in session.scalars(
+        select(TableProperty).where(
+            TableProperty.property_id.in_(property_ids)
+        )
+    ):
+        interval = next_interval(
+            timedelta(seconds=row.check_interval), changed=False
+        )
+        row.last_checked_at = now
+        row.next_check_at = now + interval
+        row.check_interval = int(interval.total_seconds())
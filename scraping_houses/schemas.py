@@ -1,14 +1,21 @@
+import hashlib
 import re
+import time
+from datetime import datetime
 from enum import Enum
-from typing import List, Union
+from typing import List, Set, Union
 from typing_extensions import Unpack
+from urllib.parse import urlsplit, urlunsplit
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import model_validator
 
 from scraping_houses.settings import Settings
 
 settings = Settings()
 
+PROPERTY_ID = re.compile(r'id-(\d+)')
+
 class FlagHouseType(Enum):
     SALE = 'venda'
     HENT = 'aluguel'
@@ -79,6 +86,175 @@ class UrlConfig(BaseModel):
     min_price: int = 0
     max_price: int = 0
 
+    @property
+    def config_hash(self) -> str:
+        return hashlib.sha1(self.model_dump_json().encode()).hexdigest()
+
+
+class CrawlConfig(BaseModel):
+    # max detail requests in flight across all hosts
+    concurrency: int = 8
+    # politeness budget applied to every single host
+    host_max_in_flight: int = 4
+    host_burst: int = 1
+    # adaptive (AIMD) request rate per host, in requests/s
+    host_requests_per_second: float = 1.0
+    host_min_rate: float = 0.1
+    host_max_rate: float = 10.0
+    rate_increase: float = 0.05
+    rate_decrease: float = 0.5
+    # retries for 403/429/5xx responses, paced by the limiter
+    max_retries: int = 3
+    # fetch listing pages 2..N concurrently once page 1 gives the total
+    parallel_listing: bool = True
+    listing_concurrency: int = 4
+    # compare the filtered result count against the unfiltered one
+    verify_filters: bool = True
+    # split searches over the pagination cap into price bands (and
+    # optionally regions) that are crawled in parallel
+    shard_price_bands: bool = False
+    shard_regions: bool = False
+    # resume from (and save) crawl checkpoints in the database
+    resume: bool = True
+    # detail urls are claimed from the db frontier in leased batches
+    frontier_batch: int = 36
+    frontier_lease_seconds: int = 600
+    frontier_poll: float = 1.0
+    # refetch known properties that are due instead of crawling listings
+    recrawl: bool = False
+    recrawl_limit: int = 0
+    # store listing cards and fetch detail pages only for changed cards
+    # (and for unseen ones with cards_fetch_new)
+    cards_only: bool = False
+    cards_fetch_new: bool = False
+    # on-disk response cache; offline serves only from it
+    cache: bool = False
+    cache_path: str = settings.CACHE_PATH
+    cache_max_bytes: int = 1 << 30
+    cache_ttl_listing: int = 6 * 3600
+    cache_ttl_detail: int = 7 * 86400
+    offline: bool = False
+    # bounded queues between the pipeline stages (backpressure)
+    url_queue_size: int = 72
+    parse_queue_size: int = 16
+    write_queue_size: int = 64
+    # the db writer flushes this many properties per transaction, or
+    # whatever it has this long after the first one arrived
+    write_batch_size: int = 64
+    write_flush_interval: float = 1.0
+    parse_workers: int = 1
+    # threads parsing html off the event loop (lxml releases the gil);
+    # 0 parses inline
+    parse_threads: int = 2
+    # keep every request, parse and write time in the stats (benchmarks)
+    sample_timings: bool = False
+
+
+class PortalConfig(BaseModel):
+    host: str = '127.0.0.1'
+    port: int = 8765
+    # synthetic listings behind the search pages
+    listings: int = 1000
+    seed: int = 0
+    # injected faults, per request
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    # answer 429 above this request rate (0 disables)
+    max_requests_per_second: float = 0.0
+    # wrap synthetic pages in the recorded home page <head>
+    shell: bool = True
+    # embed the listing json state in detail pages
+    embed_state: bool = True
+    trace_path: str = settings.TRACE_PATH
+    # response cache recorded with `crawl --cache` to replay first
+    replay_path: str = ''
+
+
+class CrawlStats(BaseModel):
+    started_at: float = Field(default_factory=time.monotonic)
+    listing_pages: int = 0
+    detail_pages: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    cards: int = 0
+    flushes: int = 0
+    # seconds per network request, detail parse and db write; only
+    # recorded with sample_timings, they grow with the crawl
+    sample_timings: bool = Field(default=False, exclude=True)
+    latencies: List[float] = Field(default_factory=list, exclude=True)
+    parse_times: List[float] = Field(default_factory=list, exclude=True)
+    write_times: List[float] = Field(default_factory=list, exclude=True)
+    flush_times: List[float] = Field(default_factory=list, exclude=True)
+    max_write_queue_depth: int = 0
+
+    def sample(self, samples: List[float], seconds: float):
+        if self.sample_timings:
+            samples.append(seconds)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def detail_pages_per_second(self) -> float:
+        return self.detail_pages / max(self.elapsed, 1e-9)
+
+    @property
+    def listing_pages_per_second(self) -> float:
+        return self.listing_pages / max(self.elapsed, 1e-9)
+
+    def __str__(self) -> str:
+        return (
+            f'<CrawlStats listing={self.listing_pages} cards={self.cards} '
+            f'detail={self.detail_pages} errors={self.errors} '
+            f'cache={self.cache_hits} '
+            f'{self.detail_pages_per_second:.2f} pages/s>'
+        )
+
+
+class IngestResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+    def __add__(self, other: 'IngestResult') -> 'IngestResult':
+        return IngestResult(
+            inserted=self.inserted + other.inserted,
+            updated=self.updated + other.updated,
+            unchanged=self.unchanged + other.unchanged,
+        )
+
+    def __str__(self) -> str:
+        return (
+            f'<IngestResult inserted={self.inserted} '
+            f'updated={self.updated} unchanged={self.unchanged}>'
+        )
+
+
+class CrawlCheckpoint(BaseModel):
+    config_hash: str
+    total_properties: int = 0
+    # every listing page up to this one had its urls queued
+    last_page: int = 0
+    completed_pages: Set[int] = Field(default_factory=set, exclude=True)
+
+    def complete_page(self, page: int):
+        self.completed_pages.add(page)
+        while self.last_page + 1 in self.completed_pages:
+            self.last_page += 1
+
+    def __str__(self) -> str:
+        return (
+            f'<CrawlCheckpoint {self.config_hash[:8]} '
+            f'page {self.last_page} of {self.total_properties}>'
+        )
+
 
 class Property(BaseModel):
     url: str
@@ -96,24 +272,53 @@ class Property(BaseModel):
     description: List[str] = []
     images: List[str] = []
     published_at: str = ''
+    # typed values, from the embedded json or parsed from the text above
+    price_cents: Union[int, None] = None
+    condo_fee_cents: Union[int, None] = None
+    area_m2: Union[int, None] = None
+    bedrooms: Union[int, None] = None
+    bathrooms: Union[int, None] = None
+    parking_spaces: Union[int, None] = None
+    # absolute time of published_at, and the city zone ('zona-sul')
+    published_on: Union[datetime, None] = None
+    region: Union[str, None] = None
     
-    @property
-    def property_id(self) -> str:
-        return re.findall(r'id-(\d+)', self.url)[0]
-    
+    # the listing's key everywhere, parsed once from the url
+    property_id: Union[int, None] = None
+
+    @field_validator('url')
+    @classmethod
+    def canonical_url(cls, url: str) -> str:
+        # '/imovel/x-id-1/?utm_source=a#fotos' -> '/imovel/x-id-1/'
+        parts = urlsplit(url)
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+    @model_validator(mode='after')
+    def parse_property_id(self) -> 'Property':
+        if self.property_id is None:
+            match = PROPERTY_ID.search(self.url)
+            self.property_id = int(match.group(1)) if match else None
+        return self
+
     def __str__(self) -> str:
         return f'<Property {self.property_id}>'
 
 
-class Page(BaseModel):
+class ListingContent(BaseModel):
+    """Everything read from one listing page, parsed once."""
+
+    properties: List[Property] = []
+    page: int = 0
+    total_properties: int = 0
+
+
+class Page(ListingContent):
     url: str
     status_code: int
     reason: str
     primary_ip: str
     local_ip: str
     html: str
-    properties: List[Property]
-    page: int
 
     def __str__(self) -> str:
         return f'<Page {self.page} ({self.url}) Property {len(self.properties)}>'
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import Dict
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def is_backoff(status_code: int) -> bool:
+    return (
+        status_code in {HTTPStatus.FORBIDDEN, HTTPStatus.TOO_MANY_REQUESTS}
+        or status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+    )
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Token bucket whose rate follows the responses it gets back (AIMD).
+
+    Every healthy response adds `increase` requests/s up to `max_rate`;
+    a 403/429/5xx multiplies the rate by `decrease` down to `min_rate`.
+    Backoffs closer than one request interval apart count once, so a
+    burst of concurrent 429s doesn't collapse the rate to the floor.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        rate: float = 1.0,
+        *,
+        min_rate: float = 0.1,
+        max_rate: float = 10.0,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        burst: int = 1,
+    ):
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.backoffs = 0
+        self._last_backoff = 0.0
+
+    def record(self, status_code: int):
+        now = time.monotonic()
+        if is_backoff(status_code):
+            if now - self._last_backoff < 1 / self.rate:
+                return
+            self._last_backoff = now
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0)
+            self.backoffs += 1
+        elif status_code < HTTPStatus.BAD_REQUEST:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class HostBudget:
+    """Per-host politeness budget.
+
+    Caps the number of in-flight requests to a single host and spaces
+    request starts with an adaptive token bucket, so raising the global
+    concurrency never turns into a burst against the portal.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        requests_per_second: float = 1.0,
+        burst: int = 1,
+        **limiter_options,
+    ):
+        self.max_in_flight = max_in_flight
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.limiter_options = limiter_options
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, AdaptiveRateLimiter] = {}
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlsplit(url).netloc
+
+    def bucket(self, host: str) -> AdaptiveRateLimiter:
+        if host not in self._buckets:
+            self._buckets[host] = AdaptiveRateLimiter(
+                self.requests_per_second,
+                burst=self.burst,
+                **self.limiter_options,
+            )
+        return self._buckets[host]
+
+    def record(self, url: str, status_code: int):
+        self.bucket(self.host(url)).record(status_code)
+
+    @property
+    def rates(self) -> Dict[str, float]:
+        return {host: b.rate for host, b in self._buckets.items()}
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._slots:
+            self._slots[host] = asyncio.Semaphore(self.max_in_flight)
+        return self._slots[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = self.host(url)
+        async with self._semaphore(host):
+            await self.bucket(host).acquire()
+            yield
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List
+
+from scraping_houses.schemas import FlagHouseType, FlagRegion, UrlConfig
+from scraping_houses.utils import logger
+
+CountFn = Callable[[UrlConfig], Awaitable[int]]
+
+# upper bound used to close an open-ended (max_price=0) price range
+PRICE_CEILING: Dict[FlagHouseType, int] = {
+    FlagHouseType.SALE: 100_000_000,
+    FlagHouseType.HENT: 100_000,
+    FlagHouseType.LAUNCH: 100_000_000,
+}
+
+
+class ShardPlanner:
+    """Split a UrlConfig until every shard fits under the pagination cap.
+
+    Each candidate shard is counted with `count` (page 1 of its search);
+    shards over `max_results` are split by region (when enabled and the
+    config has none) and then by bisecting [min_price, max_price].
+    """
+
+    def __init__(
+        self,
+        count: CountFn,
+        max_results: int,
+        split_regions: bool = False,
+        min_band: int = 1,
+    ):
+        self.count = count
+        self.max_results = max_results
+        self.split_regions = split_regions
+        self.min_band = min_band
+        self.totals: Dict[str, int] = {}
+
+    def split(self, cfg: UrlConfig) -> List[UrlConfig]:
+        if (
+            self.split_regions
+            and cfg.region is None
+            and cfg.state
+            and cfg.country
+        ):
+            return [cfg.model_copy(update={'region': r}) for r in FlagRegion]
+
+        ceiling = PRICE_CEILING[cfg.house_type]
+        if not cfg.max_price:
+            if cfg.min_price >= ceiling:
+                return []
+            # close the range; everything above the ceiling is one band
+            return [
+                cfg.model_copy(update={'max_price': ceiling}),
+                cfg.model_copy(update={'min_price': ceiling + 1}),
+            ]
+        if cfg.max_price - cfg.min_price <= self.min_band:
+            return []
+        mid = (cfg.min_price + cfg.max_price) // 2
+        return [
+            cfg.model_copy(update={'max_price': mid}),
+            cfg.model_copy(update={'min_price': mid + 1}),
+        ]
+
+    async def _count(self, cfg: UrlConfig) -> int:
+        total = await self.count(cfg)
+        self.totals[cfg.model_dump_json()] = total
+        return total
+
+    async def plan(self, cfg: UrlConfig) -> List[UrlConfig]:
+        return await self._plan(cfg, await self._count(cfg))
+
+    async def _plan(self, cfg: UrlConfig, total: int) -> List[UrlConfig]:
+        if total == 0:
+            return []
+        if total <= self.max_results:
+            return [cfg]
+        children = self.split(cfg)
+        if not children:
+            logger.warning(
+                f'[PLANNER] {total} properties in an unsplittable shard '
+                f'{cfg.min_price}-{cfg.max_price}, crawl will be partial'
+            )
+            return [cfg]
+        totals = await asyncio.gather(*(self._count(c) for c in children))
+        if all(t == total for t in totals):
+            logger.warning(
+                f'[PLANNER] every sub-shard reports {total} properties, '
+                'the server is ignoring the shard filters'
+            )
+            return [cfg]
+        logger.info(
+            f'[PLANNER] {total} properties, splitting into {len(children)}'
+        )
+        shards = await asyncio.gather(
+            *(self._plan(c, t) for c, t in zip(children, totals))
+        )
+        return [s for shard in shards for s in shard]
@@ -0,0 +1,165 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+from queue import Empty
+from typing import List
+
+from scraping_houses.database import get_engine
+from scraping_houses.frontier import Frontier
+from scraping_houses.schemas import (
+    CrawlConfig,
+    CrawlStats,
+    FlagPropertyType,
+    FlagRegion,
+    Property,
+    UrlConfig,
+)
+from scraping_houses.scrapings.vivareal import ScrapingVivalreal
+from scraping_houses.utils import logger
+
+
+def split_work(cfg: UrlConfig) -> List[UrlConfig]:
+    """One shard per FlagRegion x FlagPropertyType not fixed by `cfg`."""
+    regions = [cfg.region] if cfg.region else list(FlagRegion)
+    types = cfg.property_type or list(FlagPropertyType)
+    return [
+        cfg.model_copy(update={'region': r, 'property_type': [t]})
+        for r in regions
+        for t in types
+    ]
+
+
+def per_worker_config(cfg: CrawlConfig, workers: int) -> CrawlConfig:
+    # every process has its own HostBudget, so split the per-host
+    # budget between them to keep the same total politeness
+    return cfg.model_copy(update={
+        'host_max_in_flight': math.ceil(cfg.host_max_in_flight / workers),
+        'host_requests_per_second': cfg.host_requests_per_second / workers,
+        'host_min_rate': cfg.host_min_rate / workers,
+        'host_max_rate': cfg.host_max_rate / workers,
+        'rate_increase': cfg.rate_increase / workers,
+        # checked once for the whole search, before it is split
+        'verify_filters': False,
+    })
+
+
+async def check_filters(scraper: ScrapingVivalreal) -> bool:
+    async with scraper.session() as session:
+        scraper.total_properties = await scraper.count_properties(
+            session, scraper.url_cfg
+        )
+        return await scraper.verify_filters(session)
+
+
+def crawl_worker(url_cfg: str, crawl_cfg: str, queue) -> dict:
+    scraper = ScrapingVivalreal(
+        UrlConfig.model_validate_json(url_cfg),
+        CrawlConfig.model_validate_json(crawl_cfg),
+    )
+
+    async def sink(property: Property):
+        await asyncio.to_thread(queue.put, property.model_dump())
+
+    async def main():
+        scraper.sink = sink
+        # the parent's writer completes the url once it is saved
+        scraper.sink_completes = False
+        async with scraper.session() as s:
+            await scraper.crawl(s)
+
+    asyncio.run(main())
+    return scraper.stats.model_dump(exclude={'started_at'})
+
+
+def write_worker(
+    queue,
+    stats: CrawlStats,
+    scraper: ScrapingVivalreal,
+    frontier: Frontier,
+):
+    """Save what the workers send in batches, like the write stage.
+
+    Only saved properties are completed in the frontier; failed ones
+    go back to it for a retry.
+    """
+    cfg = scraper.crawl_cfg
+    closed = False
+    while not closed:
+        batch = []
+        flush_at = None
+        while len(batch) < cfg.write_batch_size:
+            try:
+                timeout = flush_at and max(flush_at - time.monotonic(), 0)
+                item = queue.get(timeout=timeout)
+            except Empty:
+                break
+            if item is None:
+                closed = True
+                break
+            # already validated (and parsed) in the worker process
+            batch.append(Property.model_construct(**item))
+            flush_at = flush_at or time.monotonic() + cfg.write_flush_interval
+        if batch:
+            saved, failed = scraper.save_batch(batch)
+            stats.detail_pages += len(saved)
+            stats.errors += len(failed)
+            if saved:
+                frontier.complete([p.url for p in saved])
+            if failed:
+                frontier.fail([p.url for p in failed])
+
+
+def crawl_pool(
+    url_cfg: UrlConfig,
+    crawl_cfg: CrawlConfig,
+    workers: int,
+) -> CrawlStats:
+    """Crawl the shards of `url_cfg` on a pool of `workers` processes.
+
+    Every process runs its own event loop and AsyncSession; parsed
+    properties come back through a queue to a single writer thread.
+    """
+    scraper = ScrapingVivalreal(url_cfg, crawl_cfg, get_engine())
+    if crawl_cfg.verify_filters:
+        asyncio.run(check_filters(scraper))
+    stats = scraper.stats
+    shards = split_work(url_cfg)
+    worker_cfg = per_worker_config(crawl_cfg, workers).model_dump_json()
+    logger.info(f'[POOL] => {len(shards)} shards on {workers} workers')
+    with Manager() as manager:
+        queue = manager.Queue(crawl_cfg.write_queue_size * workers)
+        frontier = Frontier(
+            scraper.engine, max_retries=crawl_cfg.max_retries
+        )
+        writer = threading.Thread(
+            target=write_worker, args=(queue, stats, scraper, frontier)
+        )
+        writer.start()
+        try:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [
+                    pool.submit(
+                        crawl_worker,
+                        shard.model_dump_json(),
+                        worker_cfg,
+                        queue,
+                    )
+                    for shard in shards
+                ]
+                for f in as_completed(futures):
+                    try:
+                        result = f.result()
+                    except Exception as e:
+                        stats.errors += 1
+                        logger.error(f'[POOL] {e}')
+                        continue
+                    stats.listing_pages += result['listing_pages']
+                    stats.errors += result['errors']
+        finally:
+            queue.put(None)
+            writer.join()
+    logger.info(f'[POOL] => {stats}')
+    return stats
@@ -1,121 +1,412 @@
-import re, sys, os
-from enum import Enum
-from typing import List, Union
-from random import randint
-from datetime import datetime
 import asyncio
-
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Tuple, Union
+from urllib.parse import urlencode, urljoin
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
-from scraping_houses.utils import cl, panel_grid, logger
-from scraping_houses.database import engine
+from curl_cffi.requests import AsyncSession
+from lxml import etree
+from parsel import Selector
+from rich.columns import Columns
+from rich.panel import Panel
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from scraping_houses.cache import CachedResponse, ResponseCache
+from scraping_houses.checkpoint import (
+    delete_checkpoint,
+    load_checkpoint,
+    save_checkpoint,
+)
+from scraping_houses.database import get_engine
+from scraping_houses.frontier import (
+    PRIORITY_CHANGED,
+    PRIORITY_NEW,
+    PRIORITY_REFRESH,
+    Frontier,
+)
+from scraping_houses.ingest import upsert_cards, upsert_properties
+from scraping_houses.models import TableProperty
+from scraping_houses.normalize import (
+    amenity_text,
+    decimal_cents,
+    normalize_property,
+    parse_published_at,
+    region_slug,
+)
+from scraping_houses.recrawl import due_urls, postpone
 from scraping_houses.schemas import (
-    UrlConfig,
-    Property,
+    CrawlCheckpoint,
+    CrawlConfig,
+    CrawlStats,
+    FlagRegion,
+    IngestResult,
+    ListingContent,
     Page,
+    Property,
+    UrlConfig,
 )
-from scraping_houses.models import TableProperty
+from scraping_houses.scrapings.limiter import HostBudget, is_backoff
+from scraping_houses.scrapings.planner import ShardPlanner
+from scraping_houses.seen import SeenIndex
+from scraping_houses.utils import cl, logger, panel_grid
 
+# cards per listing page and the last page the portal will paginate to
+PAGE_SIZE = 36
+MAX_PAGES = 99
 
-from curl_cffi.requests import AsyncSession, Request
-from pydantic import BaseModel
-from parsel import Selector
-from sqlalchemy.orm import Session
+# seconds between frontier counts on the status panel
+STATUS_FRONTIER_INTERVAL = 10.0
+# what an offline crawl gets for a url missing from the cache
+OFFLINE_MISS = 504
+# a delisted property's detail page
+GONE = (404, 410)
 
-from rich.panel import Panel
-from rich.columns import Columns
-from rich.table import Table
-from rich.progress import Progress
+# where detail pages embed their state as json
+STATE_MARKERS = ('window.__INITIAL_STATE__', 'id="__NEXT_DATA__"')
+JSON_DECODER = json.JSONDecoder()
+BUSINESS_TYPES = {'RENTAL': 'Aluguel', 'SALE': 'Venda'}
+# json key -> typed Property field, amenity unit
+JSON_AMENITIES = (
+    ('usableAreas', 'area_m2', 'm²'),
+    ('bedrooms', 'bedrooms', 'quarto'),
+    ('bathrooms', 'bathrooms', 'banheiro'),
+    ('parkingSpaces', 'parking_spaces', 'vaga'),
+)
+
+# listing card class -> Property field
+CARD_FIELDS = {
+    'property-card__title': 'title',
+    'property-card__address': 'address',
+    'property-card__price': 'price',
+}
+
+
+class ListingUnavailable(Exception):
+    """A listing page that still failed after the limiter's retries."""
+
+
+def timed(fn, *args):
+    # measured in the thread that runs `fn`, not while it waits for one
+    started = time.perf_counter()
+    return fn(*args), time.perf_counter() - started
 
 
-class ScrapingVivalreal:
-    def __init__(self, url_config: UrlConfig = None):
+class ScrapingVivalreal:  # noqa: PLR0904
+    def __init__(
+        self,
+        url_config: UrlConfig = None,
+        crawl_config: CrawlConfig = None,
+        engine: Engine = None,
+    ):
         self.url_cfg = url_config
-        self.pages: List[Page] = []
+        self.crawl_cfg = crawl_config
+        # the default engine is only built when the db is first used
+        self._engine = engine
+        self.total_urls: int = 0
         self.total_properties: int = 0
         self.last_page: int = 0
-        
+
         if not self.url_cfg:
             self.url_cfg = UrlConfig()
+        if not self.crawl_cfg:
+            self.crawl_cfg = CrawlConfig()
+        self.budget = HostBudget(
+            max_in_flight=self.crawl_cfg.host_max_in_flight,
+            requests_per_second=self.crawl_cfg.host_requests_per_second,
+            burst=self.crawl_cfg.host_burst,
+            min_rate=self.crawl_cfg.host_min_rate,
+            max_rate=self.crawl_cfg.host_max_rate,
+            increase=self.crawl_cfg.rate_increase,
+            decrease=self.crawl_cfg.rate_decrease,
+        )
+        self.stats = CrawlStats(
+            sample_timings=self.crawl_cfg.sample_timings
+        )
+        # page 1 responses already fetched while planning shards
+        self._prefetched = {}
+        # where the writer stage sends parsed properties; the db when unset
+        self.sink = None
+        # off: whoever receives from the sink completes the frontier
+        self.sink_completes = True
+        # one checkpoint per crawled config (shard)
+        self.checkpoints: Dict[str, CrawlCheckpoint] = {}
+        # frontier updates not flushed to the database yet
+        self._done: List[str] = []
+        self._failed: List[str] = []
+        self._sent: List[str] = []
+        self.parse_pool: Union[ThreadPoolExecutor, None] = None
+        # property ids already in the db, loaded on first use
+        self._seen: Union[SeenIndex, None] = None
+        self.cache = None
+        if self.crawl_cfg.cache or self.crawl_cfg.offline:
+            self.cache = ResponseCache(
+                self.crawl_cfg.cache_path,
+                ttl={
+                    'listing': self.crawl_cfg.cache_ttl_listing,
+                    'detail': self.crawl_cfg.cache_ttl_detail,
+                },
+                max_bytes=self.crawl_cfg.cache_max_bytes,
+            )
+
+    @staticmethod
+    def pages_for(total_properties: int) -> int:
+        # a partial last page still has to be fetched
+        return -(-total_properties // PAGE_SIZE)
 
     @property
-    def total_urls(self) -> int:
-        return len([[p.url for p in p.properties] for p in self.pages])
+    def total_pages(self) -> int:
+        return self.pages_for(self.total_properties)
 
     @property
-    def total_pages(self):
-        return self.total_properties // 36
+    def engine(self) -> Engine:
+        if self._engine is None:
+            self._engine = get_engine()
+        return self._engine
 
-    def build_url(self, page: int = 0) -> str:
-        cfg = self.url_cfg
+    @property
+    def seen(self) -> SeenIndex:
+        if self._seen is None:
+            self._seen = SeenIndex.load(self.engine)
+            logger.info(
+                f'[DB] => {len(self._seen)} known properties, '
+                f'{self._seen.nbytes / 1024:.0f} KiB'
+            )
+        return self._seen
+
+    @property
+    def last_listing_page(self) -> int:
+        return max(1, min(self.total_pages, MAX_PAGES))
+
+    @staticmethod
+    def filter_params(cfg: UrlConfig) -> dict:
+        flags = {}
+        if cfg.property_type and len(cfg.property_type) > 1:
+            flags['tipos'] = ','.join(str(t) for t in cfg.property_type)
+        if cfg.rooms:
+            flags['quartos'] = cfg.rooms
+        if cfg.min_price:
+            flags['preco-desde'] = cfg.min_price
+        if cfg.max_price:
+            flags['preco-ate'] = cfg.max_price
+        return flags
+
+    def build_url(self, page: int = 0, cfg: UrlConfig = None) -> str:
+        # everything goes in the path or the query string: a #fragment
+        # never reaches the server, which then returns unfiltered results
+        cfg = cfg or self.url_cfg
         url = f"/{cfg.house_type}"
         if cfg.state:
             url += f"/{cfg.state}"
         if cfg.country and cfg.state:
             url += f"/{cfg.country}"
-        if cfg.region and self.country:
+        if cfg.region and cfg.country and cfg.state:
             url += f"/{cfg.region}"
-        # flags
-        flags = []
-        if cfg.property_type:
-            property_type = ','.join(cfg.property_type)
-            flags.append(f'tipos={property_type}')
-        if cfg.rooms:
-            flags.append(f"quartos={cfg.rooms}")
-        if cfg.min_price:
-            flags.append(f"preco-desde={cfg.min_price}")
-        if cfg.max_price:
-            flags.append(f"preco-ate={cfg.max_price}")
+        if cfg.property_type and len(cfg.property_type) == 1:
+            url += f"/{cfg.property_type[0]}"
+        url += "/"
+        flags = {'pagina': page, **self.filter_params(cfg)}
         if cfg.order_by_price:
-            flags.append(f"ordenar-por={cfg.order_by_price}")
-        url += f"?pagina={page}"
-        query_string = "&".join(flags)
-        return f"{url}#{query_string}"
+            flags['ordenar-por'] = cfg.order_by_price
+        return f"{url}?{urlencode(flags, safe=',:')}"
+
+    @staticmethod
+    def filters_applied(filtered_total: int, unfiltered_total: int) -> bool:
+        # a narrowing filter the server ignored reports the full count
+        return unfiltered_total == 0 or filtered_total < unfiltered_total
+
+    async def verify_filters(self, session: AsyncSession) -> bool:
+        cfg = self.url_cfg
+        if not self.filter_params(cfg) and not cfg.property_type:
+            return True
+        unfiltered = cfg.model_copy(update={
+            'property_type': None,
+            'rooms': 0,
+            'min_price': 0,
+            'max_price': 0,
+        })
+        req = await self.fetch(
+            session, self.build_url(1, unfiltered), 'listing'
+        )
+        unfiltered_total = await self.parse(
+            self.get_total_properties, req.text
+        )
+        if self.filters_applied(self.total_properties, unfiltered_total):
+            logger.info(
+                f'[FILTERS] => {self.total_properties} of '
+                f'{unfiltered_total} properties'
+            )
+            return True
+        logger.warning(
+            f'[FILTERS] server reported {self.total_properties} properties '
+            f'with filters and {unfiltered_total} without, '
+            'the filters were not applied'
+        )
+        return False
 
     def next_page(self):
         url = self.build_url(self.last_page + 1)
         self.last_page += 1
         return url
 
-    def get_urls(self, html: str) -> List[Property]:
+    @staticmethod
+    def card_text(element) -> str:
+        return ' '.join(
+            t.strip() for t in element.itertext() if t.strip()
+        )
+
+    def read_card(self, card) -> Union[Property, None]:
+        # one walk over the card's lxml elements instead of a css query
+        # (and a Selector per match) for every field
+        url, fields, details = None, {}, []
+        for el in card.iter(etree.Element):
+            classes = (el.get('class') or '').split()
+            if not classes:
+                continue
+            if url is None and 'property-card__content-link' in classes:
+                url = el.get('href')
+            if 'property-card__detail-item' in classes:
+                details.append(self.card_text(el))
+                continue
+            for cls in classes:
+                field = CARD_FIELDS.get(cls)
+                if field and field not in fields:
+                    fields[field] = self.card_text(el)
+        if not url:
+            return None
+        return Property(url=url, properties=details, **fields)
+
+    def extract_listing(
+        self,
+        html: str,
+        cards: bool = True,
+    ) -> ListingContent:
+        """Urls (with their card fields), total and current page."""
+        content = ListingContent()
         try:
             sel = Selector(html)
-            return [
-                Property(url=url) for url in
-                sel.css(
-                    'article.property-card__container \
-                        a.property-card__content-link::attr(href)'
-                ).getall()
-            ]
         except Exception as e:
             logger.error(f'[SELECTOR] {e}')
-            return []
+            return content
+        if cards:
+            for card in sel.css('article.property-card__container'):
+                p = self.read_card(card.root)
+                if p:
+                    content.properties.append(p)
+        else:
+            content.properties = [
+                Property(url=url) for url in sel.css(
+                    'article.property-card__container '
+                    'a.property-card__content-link::attr(href)'
+                ).getall()
+            ]
+        total = sel.css(
+            '.results-summary__data strong.results-summary__count::text'
+        ).get()
+        page = sel.css(
+            'button.js-change-page[data-active]::attr(data-page)'
+        ).get()
+        try:
+            content.total_properties = int(total.replace('.', ''))
+        except (AttributeError, ValueError) as e:
+            logger.error(f'[SELECTOR] total properties: {e}')
+        try:
+            content.page = int(page)
+        except (TypeError, ValueError) as e:
+            logger.error(f'[SELECTOR] current page: {e}')
+        return content
+
+    def get_urls(self, html: str) -> List[Property]:
+        return self.extract_listing(html, cards=False).properties
 
     def get_total_properties(self, html: str) -> int:
-        try:
-            return int(Selector(html).css(
-                '.results-summary__data strong.results-summary__count::text'
-            ).get().replace('.', ''))
-        except Exception as e:
-            logger.error(f'[SELECTOR] {e}')
-            return 0
+        return self.extract_listing(html, cards=False).total_properties
 
     def get_current_page(self, html: str) -> int:
-        try:
-            return int(Selector(html).css(
-                'button.js-change-page[data-active]::attr(data-page)'
-            ).get())
-        except Exception as e:
-            logger.error(f'[SELECTOR] {e}')
-            return 0
+        return self.extract_listing(html, cards=False).page
 
-    def extract_all_content_from_page(
-        self,
+    @staticmethod
+    def find_embedded_listing(
         html: str,
-        property: Property,
-    ) -> Property:
+        property_id: Union[int, None],
+    ) -> Union[dict, None]:
+        """The listing object of the json state embedded in the page.
+
+        The state also holds recommended and similar listings, so only
+        the object with the page's own id is taken.
+        """
+        if property_id is None:
+            return None
+        for marker in STATE_MARKERS:
+            at = html.find(marker)
+            if at < 0:
+                continue
+            try:
+                state, _ = JSON_DECODER.raw_decode(html, html.find('{', at))
+            except ValueError as e:
+                logger.warning(f'[SELECTOR] {marker} {e}')
+                continue
+            stack = [state]
+            while stack:
+                node = stack.pop()
+                if isinstance(node, dict):
+                    if (
+                        'pricingInfos' in node
+                        and str(node.get('id')) == str(property_id)
+                    ):
+                        return node
+                    stack.extend(node.values())
+                elif isinstance(node, list):
+                    stack.extend(node)
+        return None
+
+    @staticmethod
+    def extract_from_json(listing: dict, property: Property) -> Property:
+        p = property
+        pricing = listing['pricingInfos'][0]
+        address = listing.get('address') or {}
+        p.title = listing.get('title', '')
+        p.property_type = BUSINESS_TYPES.get(pricing.get('businessType'), '')
+        p.price_cents = decimal_cents(pricing['price'])
+        p.price = f'R$ {p.price_cents // 100:,}'.replace(',', '.')
+        fee = pricing.get('monthlyCondoFee')
+        p.condo_fee_cents = decimal_cents(fee) if fee else None
+        p.additional_price = [
+            f'R$ {p.condo_fee_cents // 100:,}'.replace(',', '.')
+        ] if p.condo_fee_cents else []
+        p.address = (
+            f'{address.get("street", "")}, '
+            f'{address.get("streetNumber", "")} - '
+            f'{address.get("neighborhood", "")}, '
+            f'{address.get("city", "")} - {address.get("stateAcronym", "")}'
+        )
+        amenities = []
+        for key, field, unit in JSON_AMENITIES:
+            values = listing.get(key) or []
+            if values:
+                setattr(p, field, int(values[0]))
+                amenities.append(amenity_text(int(values[0]), unit))
+        p.properties = amenities
+        description = listing.get('description')
+        p.description = [description] if description else []
+        p.published_at = listing.get('createdAt', '')
+        p.published_on = parse_published_at(p.published_at)
+        p.region = region_slug(address.get('zone'))
+        p.images = [
+            m['url'] for m in listing.get('medias', []) if m.get('url')
+        ]
+        return p
+
+    @staticmethod
+    def extract_from_css(html: str, property: Property) -> Property:
         s = Selector(html)
         p = property
         p.title = s.css('h1.description__title::text').get()
@@ -130,83 +421,156 @@ class ScrapingVivalreal:
         p.properties = s.css('p.amenities-item::text').getall()
         p.description = s.css(
             'div.desktop-only-container .description__content--text::text'
-        ).get()
+        ).getall()
         p.published_at = s.css(
             'div.desktop-only-container span.description__created-at::text'
         ).get()
         p.images = s.css(
             'li.carousel-photos--item img::attr(srcset)'
         ).getall()
-        return p
+        return normalize_property(p)
 
+    def extract_all_content_from_page(
+        self,
+        html: str,
+        property: Property,
+    ) -> Property:
+        """Read the embedded json state, or the rendered html without it."""
+        listing = self.find_embedded_listing(html, property.property_id)
+        if listing:
+            try:
+                return self.extract_from_json(listing, property)
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                logger.warning(f'[SELECTOR] {property} json state: {e}')
+        return self.extract_from_css(html, property)
 
-    async def get_all_content_from_page(
-            self, 
-            session: AsyncSession, 
-            page: Page
-        ) -> Page:
-            for p in page.properties:
-                if self.property_exists_on_db(p):
-                    logger.info(f'[MAIN] => {p} already exists on db, skipping..')
-                    continue
-                logger.info(f'[REQUEST] => {p.url}')
-                req = await session.get(p.url)
+    async def parse(self, fn, *args):
+        """Run a parser in the parse thread pool, the loop keeps on I/O."""
+        if not self.crawl_cfg.parse_threads:
+            return fn(*args)
+        if self.parse_pool is None:
+            self.parse_pool = ThreadPoolExecutor(
+                self.crawl_cfg.parse_threads, thread_name_prefix='parse'
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.parse_pool, fn, *args)
+
+    def close_parse_pool(self):
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+            self.parse_pool = None
+
+    async def fetch(
+        self,
+        session: AsyncSession,
+        url: str,
+        kind: str = 'detail',
+    ):
+        full_url = urljoin(self.url_cfg.url_base, url)
+        if self.cache:
+            # hits never touch the host budget
+            cached = await asyncio.to_thread(
+                self.cache.get, full_url, kind, self.crawl_cfg.offline
+            )
+            if cached:
+                self.stats.cache_hits += 1
+                logger.info(f'[CACHE] <= {url}')
+                return cached
+            if self.crawl_cfg.offline:
+                logger.warning(f'[CACHE] miss on {url} (offline)')
+                return CachedResponse(
+                    url=full_url,
+                    text='',
+                    status_code=OFFLINE_MISS,
+                    reason='Offline cache miss',
+                )
+        for attempt in range(self.crawl_cfg.max_retries + 1):
+            async with self.budget.slot(full_url):
+                logger.info(f'[REQUEST] => {url}')
+                started = time.perf_counter()
+                req = await session.get(url)
+                self.stats.sample(
+                    self.stats.latencies, time.perf_counter() - started
+                )
                 logger.info(f'[RESPONSE] <= {req}')
-                p = self.extract_all_content_from_page(req.text, p)
-                p.status_code=req.status_code
-                p.reason=req.reason
-                p.local_ip=req.local_ip
-                p.primary_ip=req.primary_ip
-                await self.add_property_to_db(p)
-                await asyncio.sleep(randint(1,5))
-            return page
-
-    def property_exists_on_db(self, property: Property) -> bool:
-        with Session(engine) as session:
-            req = session.query(TableProperty).filter_by(
-                url=property.url
-            ).first()
-            if req:
-                logger.info(f'[DB] => [EXIST] {req}')
-                return True
-            logger.info(f'[DB] => [NOT EXIST] {req}')
-            return False
+            self.budget.record(full_url, req.status_code)
+            if not is_backoff(req.status_code):
+                break
+            logger.warning(
+                f'[LIMITER] {req.status_code} {req.reason} on {url} '
+                f'({attempt + 1}), rate {self.budget.rates}'
+            )
+        if self.cache and req.status_code == HTTPStatus.OK:
+            await asyncio.to_thread(self.cache.put, full_url, kind, req)
+        return req
 
-    @staticmethod
-    async def add_property_to_db(property: Property):
-        with Session(engine) as session:         
-            p = property
-            db_house: TableProperty = TableProperty(
-                url=p.url,
-                status_code=p.status_code,
-                reason=p.reason,
-                local_ip=p.local_ip,
-                primary_ip=p.primary_ip,
-                title=p.title,
-                property_type=p.property_type,
-                price=p.price,
-                additional_price=p.additional_price,
-                address=p.address,
-                properties=p.properties,
-                description=p.description,
-                images=p.images,
-                published_at=p.published_at,
-                property_id=p.property_id,
+    def save_property(self, property: Property) -> TableProperty:
+        self.save_properties([property])
+        with Session(self.engine) as session:
+            return session.scalar(
+                select(TableProperty).filter_by(
+                    property_id=property.property_id
+                )
             )
-            session.add(db_house)
+
+    def postpone(self, property: Property):
+        with Session(self.engine) as session:
+            postpone(session, [property.property_id])
+            session.commit()
+
+    def save_properties(self, properties: List[Property]) -> IngestResult:
+        """Upsert a batch of properties in one transaction."""
+        with Session(self.engine) as session:
+            result = upsert_properties(session, properties)
             session.commit()
-            session.refresh(db_house)
-            logger.info(f'[DB] => [ADD] {db_house}')
-        return db_house
+        logger.info(f'[DB] => [UPSERT] {result}')
+        return result
 
-    
-    def panel_page(self, page: Page) -> Panel:
+    def save_batch(
+        self,
+        properties: List[Property],
+    ) -> Tuple[List[Property], List[Property]]:
+        """Save in one transaction, or one by one if the batch fails.
+
+        Returns the (saved, failed) properties.
+        """
+        try:
+            self.save_properties(properties)
+            return properties, []
+        except Exception as e:
+            logger.error(f'[DB] batch of {len(properties)}: {e}')
+        saved, failed = [], []
+        for p in properties:
+            try:
+                self.save_properties([p])
+                saved.append(p)
+            except Exception as e:
+                failed.append(p)
+                logger.error(f'[DB] {p} {e}')
+        return saved, failed
+
+    def save_cards(
+        self,
+        cards: List[Property],
+    ) -> Tuple[List[str], List[str]]:
+        """Upsert listing cards; returns the (new, changed) urls."""
+        with Session(self.engine) as session:
+            new, changed = upsert_cards(session, cards)
+            session.commit()
+        logger.info(
+            f'[DB] => [CARDS] {len(cards)} cards, {len(new)} new, '
+            f'{len(changed)} changed'
+        )
+        return new, changed
+
+    @staticmethod
+    def panel_page(page: Page) -> Panel:
         logger.info(f'[RICH] => {page}')
         return Panel(
             Columns([
                 Panel(
                     panel_grid(
-                            [   (
+                            [(
                                     f'Url: {p.url}',
                                     f'Status: {p.property_id}'
                                 ),
@@ -231,75 +595,510 @@ class ScrapingVivalreal:
                     width=60,
                     title=f'# {p.property_id} - {p.title}'
                 ) for p in page.properties
-                
+
             ]),
             expand=True,
             title=f'{page.page} - {page.url} ({len(page.properties)})',
         )
 
-    
-    async def run(self):
-        def status():
-            orde = 0
-            if len(self.pages) != 0:
-                orde = len(self.pages[-1].properties)
-            return Panel(
-                f'Ord: {orde}\n\
-                Url: {url}\n\
-                Page: {self.last_page} - {self.total_pages}',
-                title='Scraping...'
+    async def count_properties(
+        self,
+        session: AsyncSession,
+        cfg: UrlConfig,
+    ) -> int:
+        url = self.build_url(1, cfg)
+        req = await self.fetch(session, url, 'listing')
+        self.stats.listing_pages += 1
+        if req.status_code != HTTPStatus.OK:
+            # an error page has no count, and 0 would drop the search
+            self.stats.errors += 1
+            raise ListingUnavailable(
+                f'{url} gave {req.status_code} {req.reason}'
+            )
+        content = await self.parse(
+            self.extract_listing, req.text, self.crawl_cfg.cards_only
+        )
+        self._prefetched[url] = (req, content)
+        return content.total_properties
+
+    async def plan_shards(self, session: AsyncSession) -> List[UrlConfig]:
+        planner = ShardPlanner(
+            lambda cfg: self.count_properties(session, cfg),
+            max_results=PAGE_SIZE * MAX_PAGES,
+            split_regions=self.crawl_cfg.shard_regions,
+        )
+        shards = await planner.plan(self.url_cfg)
+        self.total_properties = planner.totals[
+            self.url_cfg.model_dump_json()
+        ]
+        # drop the page 1 of every shard that was split further
+        leaves = {self.build_url(1, cfg) for cfg in shards}
+        self._prefetched = {
+            url: req for url, req in self._prefetched.items()
+            if url in leaves
+        }
+        logger.info(
+            f'[PLANNER] => {len(shards)} shards for '
+            f'{self.total_properties} properties'
+        )
+        return shards
+
+    def checkpoint_for(self, cfg: UrlConfig) -> CrawlCheckpoint:
+        key = cfg.config_hash
+        if key not in self.checkpoints:
+            cp = None
+            if self.crawl_cfg.resume:
+                with Session(self.engine) as session:
+                    cp = load_checkpoint(session, key)
+                if cp:
+                    logger.info(f'[CHECKPOINT] => resuming {cp}')
+            self.checkpoints[key] = cp or CrawlCheckpoint(config_hash=key)
+        return self.checkpoints[key]
+
+    def save_checkpoints(self, *checkpoints: CrawlCheckpoint):
+        if not self.crawl_cfg.resume:
+            return
+        with Session(self.engine) as session:
+            for cp in checkpoints or self.checkpoints.values():
+                save_checkpoint(session, cp)
+
+    def finish_checkpoints(self):
+        if not self.crawl_cfg.resume:
+            return
+        with Session(self.engine) as session:
+            for cp in self.checkpoints.values():
+                pages = self.pages_for(cp.total_properties)
+                if cp.last_page < max(1, min(pages, MAX_PAGES)):
+                    save_checkpoint(session, cp)
+                    logger.warning(f'[CHECKPOINT] => unfinished {cp}')
+                else:
+                    delete_checkpoint(session, cp.config_hash)
+
+    async def detail_done(self, property: Property, ok: bool = True):
+        (self._done if ok else self._failed).append(property.url)
+        await self.flush_frontier(full=True)
+
+    async def detail_sent(self, property: Property):
+        # the sink's receiver completes it, keep it leased till then
+        self._sent.append(property.url)
+        await self.flush_frontier(full=True)
+
+    async def flush_frontier(self, full: bool = False):
+        pending = len(self._done) + len(self._failed) + len(self._sent)
+        if full and pending < self.crawl_cfg.frontier_batch:
+            return
+        done, self._done = self._done, []
+        failed, self._failed = self._failed, []
+        sent, self._sent = self._sent, []
+        if sent:
+            await asyncio.to_thread(self.frontier.hand_off, sent)
+        if done:
+            await asyncio.to_thread(self.frontier.complete, done)
+        if failed:
+            await asyncio.to_thread(self.frontier.fail, failed)
+
+    async def fetch_listing(
+        self,
+        session: AsyncSession,
+        page_number: int,
+        cfg: UrlConfig = None,
+    ) -> Union[Page, None]:
+        cfg = cfg or self.url_cfg
+        url = self.build_url(page_number, cfg)
+        req, content = self._prefetched.pop(url, (None, None))
+        if req is None:
+            req = await self.fetch(session, url, 'listing')
+            self.stats.listing_pages += 1
+            if req.status_code != HTTPStatus.OK:
+                # not an empty page: leave it out of the checkpoint so
+                # the next run fetches it again
+                self.stats.errors += 1
+                logger.error(
+                    f'[LISTING] {url} gave up: {req.status_code} '
+                    f'{req.reason}'
+                )
+                return None
+            content = await self.parse(
+                self.extract_listing, req.text, self.crawl_cfg.cards_only
+            )
+        page = Page(
+            url=url,
+            status_code=req.status_code,
+            reason=req.reason,
+            local_ip=req.local_ip,
+            primary_ip=req.primary_ip,
+            html=req.text,
+            properties=content.properties,
+            page=content.page or page_number,
+            total_properties=content.total_properties,
+        )
+        self.last_page = max(self.last_page, page.page)
+        self.total_urls += len(page.properties)
+        logger.info(f'[LISTING] => {page}')
+        if self.crawl_cfg.cards_only:
+            await self.store_cards(page, req, cfg.region)
+        else:
+            new = [
+                p.url for p in page.properties
+                if p.property_id not in self.seen
+            ]
+            logger.info(
+                f'[MAIN] => {len(page.properties) - len(new)} already '
+                f'exist on db, skipping..'
+            )
+            await asyncio.to_thread(self.frontier.push, new, PRIORITY_NEW)
+        self.frontier_ready.set()
+        cp = self.checkpoint_for(cfg)
+        cp.complete_page(page_number)
+        await asyncio.to_thread(self.save_checkpoints, cp)
+        return page
+
+    async def store_cards(
+        self,
+        page: Page,
+        req,
+        region: Union[FlagRegion, None] = None,
+    ):
+        for p in page.properties:
+            # a search filtered by region only lists that region
+            p.region = str(region) if region else None
+            p.status_code = req.status_code
+            p.reason = req.reason
+            p.local_ip = req.local_ip
+            p.primary_ip = req.primary_ip
+        new, changed = await asyncio.to_thread(
+            self.save_cards, page.properties
+        )
+        self.stats.cards += len(page.properties)
+        # every card is a row now
+        for p in page.properties:
+            self.seen.add(p.property_id)
+        await asyncio.to_thread(
+            self.frontier.push, changed, PRIORITY_CHANGED, requeue=True
+        )
+        if self.crawl_cfg.cards_fetch_new:
+            await asyncio.to_thread(self.frontier.push, new, PRIORITY_NEW)
+
+    async def crawl_listing(self, session: AsyncSession, cfg: UrlConfig):
+        cp = self.checkpoint_for(cfg)
+        if cp.last_page == 0:
+            first = await self.fetch_listing(session, 1, cfg)
+            if first is None:
+                return
+            cp.total_properties = first.total_properties
+        total_pages = self.pages_for(cp.total_properties)
+        if total_pages > MAX_PAGES:
+            logger.warning(
+                f'[LISTING] {cp.total_properties} properties need '
+                f'{total_pages} pages, only {MAX_PAGES} are reachable'
+            )
+        remaining = range(
+            cp.last_page + 1, max(1, min(total_pages, MAX_PAGES)) + 1
+        )
+        if not self.crawl_cfg.parallel_listing:
+            for n in remaining:
+                await self.fetch_listing(session, n, cfg)
+            return
+
+        async def worker(n: int) -> Union[Page, None]:
+            async with self.listing_slots:
+                return await self.fetch_listing(session, n, cfg)
+
+        results = await asyncio.gather(
+            *(worker(n) for n in remaining), return_exceptions=True
+        )
+        for r in results:
+            if isinstance(r, Exception):
+                self.stats.errors += 1
+                logger.error(f'[LISTING] {r}')
+
+    async def listing_stage(self, session: AsyncSession):
+        self.listing_slots = asyncio.Semaphore(
+            self.crawl_cfg.listing_concurrency
+        )
+        if self.crawl_cfg.shard_price_bands:
+            shards = await self.plan_shards(session)
+        elif (cp := self.checkpoint_for(self.url_cfg)).last_page:
+            self.total_properties = cp.total_properties
+            shards = [self.url_cfg]
+        else:
+            self.total_properties = await self.count_properties(
+                session, self.url_cfg
             )
-        async with AsyncSession(
+            shards = [self.url_cfg]
+        if self.crawl_cfg.verify_filters:
+            await self.verify_filters(session)
+        await asyncio.gather(
+            *(self.crawl_listing(session, cfg) for cfg in shards)
+        )
+
+    async def frontier_stage(self):
+        batch = self.crawl_cfg.frontier_batch
+        while True:
+            listing_done = self.listing_done.is_set()
+            # cleared before the claim, so a push while it runs wakes us
+            self.frontier_ready.clear()
+            urls = await asyncio.to_thread(self.frontier.claim, batch)
+            if not urls:
+                if listing_done:
+                    return
+                try:
+                    await asyncio.wait_for(
+                        self.frontier_ready.wait(),
+                        self.crawl_cfg.frontier_poll,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for url in urls:
+                # blocks while the detail fetchers are behind
+                await self.url_queue.put(Property(url=url))
+
+    async def refresh_stage(self):
+        limit = self.crawl_cfg.recrawl_limit or None
+
+        def due() -> List[str]:
+            with Session(self.engine) as session:
+                return due_urls(session, limit=limit)
+
+        urls = await asyncio.to_thread(due)
+        await asyncio.to_thread(
+            self.frontier.push, urls, PRIORITY_REFRESH, requeue=True
+        )
+        self.frontier_ready.set()
+        logger.info(f'[RECRAWL] => {len(urls)} properties due')
+
+    async def detail_stage(self, session: AsyncSession):
+        while (p := await self.url_queue.get()) is not None:
+            try:
+                req = await self.fetch(session, p.url)
+                if self.crawl_cfg.offline and req.status_code == OFFLINE_MISS:
+                    # left leased: released for an online run at the end
+                    continue
+                if is_backoff(req.status_code):
+                    self.stats.errors += 1
+                    await self.detail_done(p, ok=False)
+                    logger.error(f'[REQUEST] {p} gave up: {req.status_code}')
+                    continue
+                if req.status_code != HTTPStatus.OK:
+                    # nothing to parse; check it again later, not on
+                    # every recrawl
+                    await asyncio.to_thread(self.postpone, p)
+                    gone = req.status_code in GONE
+                    if not gone:
+                        self.stats.errors += 1
+                    await self.detail_done(p, ok=gone)
+                    logger.warning(f'[REQUEST] {p} {req.status_code}')
+                    continue
+                await self.parse_queue.put((p, req))
+            except Exception as e:
+                self.stats.errors += 1
+                await self.detail_done(p, ok=False)
+                logger.error(f'[REQUEST] {p} {e}')
+
+    async def parse_stage(self):
+        while (item := await self.parse_queue.get()) is not None:
+            p, req = item
+            try:
+                p, elapsed = await self.parse(
+                    timed, self.extract_all_content_from_page, req.text, p
+                )
+                self.stats.sample(self.stats.parse_times, elapsed)
+                p.status_code = req.status_code
+                p.reason = req.reason
+                p.local_ip = req.local_ip
+                p.primary_ip = req.primary_ip
+                await self.write_queue.put(p)
+            except Exception as e:
+                self.stats.errors += 1
+                await self.detail_done(p, ok=False)
+                logger.error(f'[SELECTOR] {p} {e}')
+
+    async def write_stage(self):
+        if self.sink:
+            await self.sink_stage()
+            return
+        cfg = self.crawl_cfg
+        loop = asyncio.get_running_loop()
+        batch: List[Property] = []
+        flush_at = 0.0
+        while True:
+            # flush on batch size, or write_flush_interval after the
+            # first property of the batch arrived
+            timeout = max(flush_at - loop.time(), 0) if batch else None
+            try:
+                p = await asyncio.wait_for(self.write_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await self.flush_writes(batch)
+                batch = []
+                continue
+            if p is None:
+                break
+            if not batch:
+                flush_at = loop.time() + cfg.write_flush_interval
+            batch.append(p)
+            if len(batch) >= cfg.write_batch_size:
+                await self.flush_writes(batch)
+                batch = []
+        await self.flush_writes(batch)
+
+    async def flush_writes(self, batch: List[Property]):
+        if not batch:
+            return
+        self.stats.max_write_queue_depth = max(
+            self.stats.max_write_queue_depth, self.write_queue.qsize()
+        )
+        started = time.perf_counter()
+        saved, failed = await asyncio.to_thread(self.save_batch, batch)
+        elapsed = time.perf_counter() - started
+        self.stats.flushes += 1
+        self.stats.sample(self.stats.flush_times, elapsed)
+        logger.info(
+            f'[DB] => flushed {len(saved)} in {elapsed * 1000:.1f} ms, '
+            f'{self.write_queue.qsize()} waiting'
+        )
+        for p in saved:
+            self.seen.add(p.property_id)
+            self.stats.sample(self.stats.write_times, elapsed / len(batch))
+            self.stats.detail_pages += 1
+            await self.detail_done(p)
+        for p in failed:
+            self.stats.errors += 1
+            await self.detail_done(p, ok=False)
+
+    async def sink_stage(self):
+        while (p := await self.write_queue.get()) is not None:
+            try:
+                started = time.perf_counter()
+                await self.sink(p)
+                self.seen.add(p.property_id)
+                self.stats.sample(
+                    self.stats.write_times, time.perf_counter() - started
+                )
+                self.stats.detail_pages += 1
+                if self.sink_completes:
+                    await self.detail_done(p)
+                else:
+                    await self.detail_sent(p)
+            except Exception as e:
+                self.stats.errors += 1
+                await self.detail_done(p, ok=False)
+                logger.error(f'[DB] {p} {e}')
+
+    async def crawl(self, session: AsyncSession):
+        """listing -> frontier -> detail fetchers -> parse -> db writer.
+
+        Detail urls go through the durable frontier table; every other
+        queue is bounded, so a slow stage pushes back on the ones before
+        it instead of buffering the whole crawl in memory.
+        """
+        cfg = self.crawl_cfg
+        self.frontier = Frontier(
+            self.engine,
+            lease_seconds=cfg.frontier_lease_seconds,
+            max_retries=cfg.max_retries,
+        )
+        self.frontier_ready = asyncio.Event()
+        self.listing_done = asyncio.Event()
+        self.url_queue = asyncio.Queue(cfg.url_queue_size)
+        self.parse_queue = asyncio.Queue(cfg.parse_queue_size)
+        self.write_queue = asyncio.Queue(cfg.write_queue_size)
+        feeder = asyncio.create_task(self.frontier_stage())
+        fetchers = [
+            asyncio.create_task(self.detail_stage(session))
+            for _ in range(cfg.concurrency)
+        ]
+        # one parse task per thread keeps every thread busy
+        parsers = [
+            asyncio.create_task(self.parse_stage())
+            for _ in range(max(cfg.parse_workers, cfg.parse_threads))
+        ]
+        writer = asyncio.create_task(self.write_stage())
+        try:
+            if cfg.recrawl:
+                await self.refresh_stage()
+            else:
+                await self.listing_stage(session)
+        finally:
+            self.listing_done.set()
+            self.frontier_ready.set()
+            await feeder
+            for _ in fetchers:
+                await self.url_queue.put(None)
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await self.parse_queue.put(None)
+            await asyncio.gather(*parsers)
+            await self.write_queue.put(None)
+            await writer
+            self.close_parse_pool()
+            await self.flush_frontier()
+            await asyncio.to_thread(self.frontier.release)
+            await asyncio.to_thread(self.finish_checkpoints)
+        logger.info(f'[STATS] => {self.stats}')
+        remaining = await asyncio.to_thread(self.frontier.remaining)
+        logger.info(f'[FRONTIER] => {remaining}')
+
+    def panel_resume(self) -> Panel:
+        return Panel(
+            panel_grid([
+                (f'Last Page: {self.last_page}'),
+                (f'Total pages: {self.total_pages}'),
+                (f'Total properties: {self.total_properties}'),
+                (f'Total urls: {self.total_urls}'),
+                (
+                    'Pages/s: '
+                    f'{self.stats.detail_pages_per_second:.2f}'
+                ),
+            ]),
+            title='Resume',
+        )
+
+    def session(self) -> AsyncSession:
+        return AsyncSession(
             base_url=self.url_cfg.url_base,
             impersonate='chrome',
             allow_redirects=True
-            ) as s:
-            url = self.build_url()
-            with cl.status('Scraping...') as ss:
-                for _ in range(1, 100):
-                    ss.update(status())
-                    req = await s.get(url)
-                    urls = self.get_urls(req.text)
-                    if self.last_page == 0 or self.total_pages == 0:
-                        self.total_properties = self.get_total_properties(req.text)
-                    self.last_page = self.get_current_page(req.text)
-                    ss.update(status())
-                    #TODO: Verificar se o registro ja esta no banco de dados com base no ID
-                    #TODO: E se deveremos ignorar ou atualizar/criar um novo registro
-                    page = await self.get_all_content_from_page(
-                        s,
-                        Page(
-                            url=url,
-                            status_code=req.status_code,
-                            reason=req.reason,
-                            local_ip=req.local_ip,
-                            primary_ip=req.primary_ip,
-                            html=req.text,
-                            request_at=datetime.now(),
-                            properties=urls,
-                            page=self.last_page
-                        )
-                    )
-                    cl.print(self.panel_page(page))
-                    ss.update(status())
-                    self.pages.append(page)
-
-                    cl.print(
-                        Panel(
-                            panel_grid([
-                                (f'Last Page: {self.last_page}'),
-                                (f'Total pages: {self.total_pages}'),
-                                (f'Total properties: {self.total_properties}'),
-                                (f'Total urls: {self.total_urls}')
-                            ]),
-                            title='Resume',
+        )
+
+    async def run(self):
+        def status(remaining: Dict[str, int]):
+            return Panel(
+                f'Page: {self.last_page} - {self.last_listing_page}\n'
+                f'Queues: urls {self.url_queue.qsize()} | '
+                f'parse {self.parse_queue.qsize()} | '
+                f'write {self.write_queue.qsize()}\n'
+                f'Frontier: {remaining}\n'
+                f'Rate: {self.budget.rates}\n'
+                f'{self.stats}',
+                title='Scraping...'
+            )
+
+        async def monitor(ss):
+            loop = asyncio.get_running_loop()
+            remaining, polled = {}, float('-inf')
+            while True:
+                if hasattr(self, 'write_queue'):
+                    # a GROUP BY over the whole frontier, so not every tick
+                    if loop.time() - polled >= STATUS_FRONTIER_INTERVAL:
+                        remaining = await asyncio.to_thread(
+                            self.frontier.remaining
                         )
-                    )
-                    url = self.next_page()
-                    await asyncio.sleep(3)
+                        polled = loop.time()
+                    ss.update(status(remaining))
+                await asyncio.sleep(0.5)
+
+        async with self.session() as s:
+            with cl.status('Scraping...') as ss:
+                m = asyncio.create_task(monitor(ss))
+                try:
+                    await self.crawl(s)
+                finally:
+                    m.cancel()
+        cl.print(self.panel_resume())
 
 
 if __name__ == "__main__":
     import asyncio
-    
+
     asyncio.run(ScrapingVivalreal().run())
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import List, Union
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from scraping_houses.models import TableProperty
+from scraping_houses.schemas import FlagRegion
+
+
+def search_properties(  # noqa: PLR0913
+    session: Session,
+    *,
+    region: Union[FlagRegion, str, None] = None,
+    bedrooms: int = None,
+    min_price_cents: int = None,
+    max_price_cents: int = None,
+    min_area_m2: int = None,
+    published_since: datetime = None,
+    limit: int = None,
+) -> List[TableProperty]:
+    """Properties by the typed columns, cheapest first.
+
+    Region, bedrooms and a price range are one range scan on
+    `ix_properties_search`.
+    """
+    stmt = select(TableProperty)
+    if region:
+        stmt = stmt.where(TableProperty.region == str(region))
+    if bedrooms is not None:
+        stmt = stmt.where(TableProperty.bedrooms == bedrooms)
+    if min_price_cents is not None:
+        stmt = stmt.where(TableProperty.price_cents >= min_price_cents)
+    if max_price_cents is not None:
+        stmt = stmt.where(TableProperty.price_cents <= max_price_cents)
+    if min_area_m2 is not None:
+        stmt = stmt.where(TableProperty.area_m2 >= min_area_m2)
+    if published_since is not None:
+        stmt = stmt.where(TableProperty.published_on >= published_since)
+    stmt = stmt.order_by(TableProperty.price_cents).limit(limit)
+    return list(session.scalars(stmt).all())
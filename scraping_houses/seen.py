@@ -0,0 +1,74 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from scraping_houses.models import TableProperty
+
+# recent ids are merged into the sorted array past this many
+MERGE_AT = 4096
+
+
+class SeenIndex:
+    """Property ids already in the database, kept in memory.
+
+    Ids live in a sorted `array('q')`, 8 bytes each, so a million
+    listings take ~8 MB and a lookup is a binary search. New ids go to
+    a small unsorted buffer first and are merged in bulk, so adding
+    never shifts the big array one id at a time.
+    """
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self.ids = array('q', sorted(set(ids)))
+        self.recent = array('q')
+
+    @classmethod
+    def load(cls, engine: Engine) -> 'SeenIndex':
+        with Session(engine) as session:
+            rows = session.scalars(
+                select(TableProperty.property_id).execution_options(
+                    yield_per=10_000
+                )
+            )
+            return cls(id for id in rows if id is not None)
+
+    def __contains__(self, id) -> bool:
+        if id is None:
+            return False
+        id = int(id)
+        i = bisect_left(self.ids, id)
+        if i < len(self.ids) and self.ids[i] == id:
+            return True
+        return id in self.recent
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.recent)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.ids.buffer_info()[1] + self.recent.buffer_info()[1]
+        ) * self.ids.itemsize
+
+    def add(self, id):
+        if id is None or id in self:
+            return
+        self.recent.append(int(id))
+        if len(self.recent) >= MERGE_AT:
+            self.merge()
+
+    def merge(self):
+        # slice by slice, never through a list of python ints
+        merged = array('q')
+        start = 0
+        for id in sorted(self.recent):
+            i = bisect_left(self.ids, id, start)
+            merged.extend(self.ids[start:i])
+            merged.append(id)
+            start = i
+        merged.extend(self.ids[start:])
+        self.ids = merged
+        self.recent = array('q')
@@ -6,7 +6,19 @@ class Settings(BaseSettings):
         env_file='.env', env_file_encoding='utf-8'
     )
 
-    DATABASE_URL: str
+    DATABASE_URL: str = 'sqlite:///./database.db'
+    # pool for server databases; sqlite keeps sqlalchemy's defaults
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_RECYCLE: int = 1800
+    # sqlite profile: WAL lets readers run while the crawler writes
+    SQLITE_JOURNAL_MODE: str = 'WAL'
+    SQLITE_SYNCHRONOUS: str = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT: int = 5000  # ms
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE: int = -64 * 1024  # negative is KiB
     LOGS_PATH: str = './logs'
     LOGS_SCREENSHOTS_PATH: str = './logs/screenshots'
+    CACHE_PATH: str = './cache'
+    TRACE_PATH: str = './trace.py'
     URL_VIVAREAL: str = 'https://www.vivareal.com.br'
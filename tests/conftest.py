@@ -1,9 +1,204 @@
+import asyncio
+import os
+import re
+from types import SimpleNamespace
+from typing import Iterable
+
 import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
 
-from scraping_houses.utils import get_client
+from scraping_houses.benchmarks.portal import PortalServer
+from scraping_houses.ingest import upsert_properties
+from scraping_houses.models import table_registry
+from scraping_houses.schemas import CrawlConfig, PortalConfig, Property
+from scraping_houses.scrapings.vivareal import PAGE_SIZE, ScrapingVivalreal
 
 
 @pytest.fixture
 def client():
+    from scraping_houses.utils import get_client
+
     with get_client() as client:
         yield client
+
+
+def listing_html(page: int, total: int) -> str:
+    first = (page - 1) * PAGE_SIZE
+    cards = ''.join(
+        '<article class="property-card__container">'
+        '<a class="property-card__content-link" '
+        f'href="/imovel/apartamento-{n}-id-{1000 + n}/">{n}</a>'
+        '</article>'
+        for n in range(first, min(first + PAGE_SIZE, total))
+    )
+    count = f'{total:,}'.replace(',', '.')
+    return (
+        '<div class="results-summary__data">'
+        f'<strong class="results-summary__count">{count}</strong>'
+        f'</div>{cards}'
+        f'<button class="js-change-page" data-active data-page="{page}">'
+        '</button>'
+    )
+
+
+def detail_html(url: str) -> str:
+    return (
+        f'<h1 class="description__title">{url}</h1>'
+        '<div class="price-value-wrapper">'
+        '<p id="business-type-info">Aluguel</p></div>'
+        '<p class="price-info-value">R$ 2.500</p>'
+        '<p class="address-info-value">Rua Augusta, 100</p>'
+        '<div class="desktop-only-container">'
+        '<span class="description__created-at">há 2 dias</span></div>'
+    )
+
+
+class FakeSession:
+    def __init__(
+        self,
+        total: int,
+        throttled: Iterable[int] = (),
+        gone: Iterable[str] = (),
+    ):
+        self.total = total
+        # listing pages that always answer 429
+        self.throttled = set(throttled)
+        # detail pages of delisted properties, 404
+        self.gone = set(gone)
+        self.calls = []
+
+    async def get(self, url: str):
+        self.calls.append(url)
+        await asyncio.sleep(0)
+        page = re.search(r'pagina=(\d+)', url)
+        if page and int(page.group(1)) in self.throttled:
+            return SimpleNamespace(
+                text='',
+                status_code=429,
+                reason='Too Many Requests',
+                local_ip='127.0.0.1',
+                primary_ip='127.0.0.1',
+            )
+        if url in self.gone:
+            return SimpleNamespace(
+                text='<h1>Imóvel não encontrado</h1>',
+                status_code=404,
+                reason='Not Found',
+                local_ip='127.0.0.1',
+                primary_ip='127.0.0.1',
+            )
+        text = (
+            listing_html(int(page.group(1)), self.total)
+            if page
+            else detail_html(url)
+        )
+        return SimpleNamespace(
+            text=text,
+            status_code=200,
+            reason='OK',
+            local_ip='127.0.0.1',
+            primary_ip='127.0.0.1',
+        )
+
+
+@pytest.fixture
+def fake_session():
+    """A session serving `total` synthetic listings, without network."""
+    return FakeSession
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "test.db"}')
+    table_registry.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def make_scraper(engine):
+    """A fast scraper on `engine` whose sink collects into `.written`."""
+
+    def make(fail_on: str = '', **options) -> ScrapingVivalreal:
+        s = ScrapingVivalreal(
+            crawl_config=CrawlConfig(
+                host_requests_per_second=1000,
+                host_max_rate=1000,
+                host_burst=100,
+                **options,
+            ),
+            engine=engine,
+        )
+        s.written = []
+
+        async def sink(property):
+            if fail_on and fail_on in property.url:
+                raise ValueError(property.url)
+            s.written.append(property)
+
+        s.sink = sink
+        return s
+
+    return make
+
+
+@pytest.fixture
+def scraper(make_scraper):
+    return make_scraper()
+
+
+@pytest.fixture
+def portal():
+    with PortalServer(PortalConfig(port=0, listings=300)) as server:
+        yield server
+
+
+@pytest.fixture
+def crawl_portal(portal, make_scraper):
+    """Crawl the stand-in portal into the db, or into `.written`."""
+
+    def crawl(to_db: bool = True, **options) -> ScrapingVivalreal:
+        s = make_scraper(**options)
+        s.url_cfg.url_base = portal.url
+        if to_db:
+            s.sink = None
+
+        async def run():
+            async with s.session() as session:
+                await s.crawl(session)
+
+        asyncio.run(run())
+        return s
+
+    return crawl
+
+
+@pytest.fixture
+def make_property():
+    def make(n: int, price: str = 'R$ 2.500', **fields) -> Property:
+        fields.setdefault('published_at', 'Publicado há 3 dias')
+        return Property(
+            url=f'/imovel/apartamento-id-{n}/',
+            title=f'Apartamento {n}',
+            property_type='Aluguel',
+            price=price,
+            address='Rua Augusta, 100',
+            **fields,
+        )
+
+    return make
+
+
+@pytest.fixture
+def ingest(engine):
+    """Upsert properties into `engine` in one committed transaction."""
+
+    def ingest(properties, **options):
+        with Session(engine) as session:
+            result = upsert_properties(session, properties, **options)
+            session.commit()
+        return result
+
+    return ingest
@@ -0,0 +1,61 @@
+import json
+
+from scraping_houses.benchmarks.crawl import percentiles, run_benchmark
+from scraping_houses.benchmarks.parser import (
+    load_corpus,
+    run_parser_benchmark,
+    seed_fixtures,
+)
+from scraping_houses.schemas import (
+    CrawlConfig,
+    PortalConfig,
+    Property,
+    UrlConfig,
+)
+from scraping_houses.scrapings.vivareal import ScrapingVivalreal
+
+
+def test_percentiles_nearest_rank():
+    samples = [n / 1000 for n in range(1, 101)]
+    assert percentiles(samples) == {'p50': 50.0, 'p95': 95.0, 'p99': 99.0}
+    assert percentiles([0.002]) == {'p50': 2.0, 'p95': 2.0, 'p99': 2.0}
+    assert percentiles([])['p99'] == 0.0
+
+
+def test_run_benchmark_writes_results(tmp_path):
+    output = tmp_path / 'bench.json'
+    run_benchmark(
+        PortalConfig(listings=120),
+        UrlConfig(),
+        CrawlConfig(
+            host_requests_per_second=1000, host_max_rate=1000, resume=False
+        ),
+        str(output),
+    )
+    results = json.loads(output.read_text())
+    assert results['detail_pages'] > 0
+    assert results['errors'] == 0
+    assert results['request_latency_ms']['p99'] > 0
+    assert results['peak_rss_mb'] > 0
+
+
+def test_parser_benchmark_seeds_fixtures(tmp_path):
+    fixtures = tmp_path / 'fixtures'
+    results = run_parser_benchmark(
+        str(fixtures), str(tmp_path / 'parser.json'), repeat=1
+    )
+    assert any(fixtures.glob('listing-*.html'))
+    assert any(fixtures.glob('detail-*.html'))
+    assert any(fixtures.glob('trace-*.html'))
+    assert set(results) >= {'get_urls', 'extract_all_content_from_page'}
+    assert results['get_urls']['us_per_page'] > 0
+    assert results['get_urls']['kib_per_page'] > 0
+
+
+def test_detail_fixtures_parse_their_own_listing(tmp_path):
+    seed_fixtures(str(tmp_path))
+    details = load_corpus(str(tmp_path))['detail']
+    assert details
+    for url, html in details:
+        listing_id = Property(url=url).property_id
+        assert ScrapingVivalreal.find_embedded_listing(html, listing_id)
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+import zlib
+from http import HTTPStatus
+from types import SimpleNamespace
+from urllib.parse import urljoin
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from scraping_houses.cache import ResponseCache, canonical_url
+from scraping_houses.frontier import PENDING, Frontier
+from scraping_houses.models import TableFrontier
+from scraping_houses.scrapings.vivareal import OFFLINE_MISS
+
+
+def response(text: str, status_code: int = 200):
+    return SimpleNamespace(text=text, status_code=status_code, reason='OK')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(tmp_path, ttl={'listing': 60, 'detail': 60})
+
+
+def test_canonical_url():
+    assert canonical_url(
+        'HTTPS://www.vivareal.com.br/aluguel/?pagina=2&utm_source=x'
+        '&preco-ate=3000#top'
+    ) == 'https://www.vivareal.com.br/aluguel/?pagina=2&preco-ate=3000'
+    assert canonical_url('http://a/x?b=1&a=2') == 'http://a/x?a=2&b=1'
+
+
+def test_put_get_roundtrip(cache):
+    cache.put('http://a/x?utm_medium=y', 'detail', response('<h1>x</h1>'))
+    hit = cache.get('http://a/x', 'detail')
+    assert hit.text == '<h1>x</h1>'
+    assert hit.status_code == HTTPStatus.OK
+    assert cache.get('http://a/y', 'detail') is None
+
+
+def test_ttl_expiry_but_offline_replays(cache):
+    cache.put('http://a/x', 'listing', response('old'))
+    cache.ttl['listing'] = 0
+    time.sleep(0.01)
+    assert cache.get('http://a/x', 'listing') is None
+    assert cache.get('http://a/x', 'listing', offline=True).text == 'old'
+
+
+def test_identical_bodies_are_stored_once(cache, tmp_path):
+    cache.put('http://a/1', 'detail', response('same'))
+    cache.put('http://a/2', 'detail', response('same'))
+    blobs = [p for p in (tmp_path / 'blobs').rglob('*') if p.is_file()]
+    assert len(blobs) == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(tmp_path, ttl={'detail': 60})
+    cache.put('http://a/0', 'detail', response(os.urandom(500).hex()))
+    # room for two entries, not three
+    cache.max_bytes = int(cache.size * 2.5)
+    cache.put('http://a/1', 'detail', response(os.urandom(500).hex()))
+    # touch /0 so /1 is the least recently used
+    assert cache.get('http://a/0', 'detail')
+    cache.put('http://a/2', 'detail', response(os.urandom(500).hex()))
+    assert cache.size <= cache.max_bytes
+    assert cache.get('http://a/0', 'detail')
+    assert cache.get('http://a/1', 'detail') is None
+
+
+def test_size_is_a_running_total(cache):
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    for n in range(20):
+        cache.put(f'http://a/{n}', 'detail', response(f'body {n % 5}'))
+    cache.put('http://a/0', 'detail', response('changed'))
+    assert not any('SUM(' in s for s in statements)
+    assert cache.size == cache._disk_size()
+
+
+def test_hits_read_blobs_outside_the_lock(cache, monkeypatch):
+    cache.put('http://a/x', 'detail', response('x'))
+    held = []
+    decompress = zlib.decompress
+
+    def recording(data):
+        held.append(cache._lock.locked())
+        return decompress(data)
+
+    monkeypatch.setattr(zlib, 'decompress', recording)
+    assert cache.get('http://a/x', 'detail').text == 'x'
+    assert held == [False]
+
+
+def test_offline_crawl_replays_without_network(
+    engine,
+    tmp_path,
+    make_scraper,
+    fake_session,
+):
+    path, total = str(tmp_path / 'cache'), 3
+    online = make_scraper(cache=True, cache_path=path)
+    asyncio.run(online.crawl(fake_session(total=total)))
+    with Session(engine) as session:
+        session.execute(delete(TableFrontier))
+        session.commit()
+
+    offline = make_scraper(offline=True, cache_path=path)
+    session = fake_session(total=total)
+    asyncio.run(offline.crawl(session))
+    assert session.calls == []
+    # the listing page and every detail page
+    assert offline.stats.cache_hits == 1 + total
+    assert len(offline.written) == total
+
+
+def test_offline_miss_is_not_retried(tmp_path, make_scraper, fake_session):
+    s = make_scraper(offline=True, cache_path=str(tmp_path))
+    session = fake_session(total=3)
+    req = asyncio.run(s.fetch(session, '/imovel/x/'))
+    assert req.status_code == OFFLINE_MISS
+    assert session.calls == []
+
+
+def test_offline_misses_wait_for_an_online_crawl(
+    engine,
+    tmp_path,
+    make_scraper,
+    fake_session,
+):
+    path, total = str(tmp_path / 'cache'), 3
+    s = make_scraper(cache=True, cache_path=path)
+    # only the listing page is cached
+    url = s.build_url(1)
+    page = asyncio.run(fake_session(total=total).get(url))
+    s.cache.put(urljoin(s.url_cfg.url_base, url), 'listing', page)
+    for _ in range(s.crawl_cfg.max_retries):
+        offline = make_scraper(offline=True, cache_path=path)
+        asyncio.run(offline.crawl(fake_session(total=total)))
+        assert offline.stats.errors == 0
+    assert Frontier(engine).remaining() == {PENDING: total}
+
+    session = fake_session(total=total)
+    asyncio.run(make_scraper(cache=True, cache_path=path).crawl(session))
+    details = [c for c in session.calls if 'pagina' not in c]
+    assert len(details) == total
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+
+from sqlalchemy import func, select
+
+from scraping_houses.database import create_db_engine
+from scraping_houses.models import TableCrawlCheckpoint, table_registry
+from scraping_houses.settings import Settings
+
+# PRAGMA synchronous values
+NORMAL, FULL = 1, 2
+
+
+def pragma(engine, name: str):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+
+def test_sqlite_profile(tmp_path):
+    engine = create_db_engine(f'sqlite:///{tmp_path / "test.db"}')
+    assert pragma(engine, 'journal_mode') == 'wal'
+    assert pragma(engine, 'synchronous') == NORMAL
+    assert pragma(engine, 'busy_timeout') == Settings().SQLITE_BUSY_TIMEOUT
+    engine.dispose()
+
+
+def test_profile_comes_from_settings(tmp_path):
+    settings = Settings(
+        SQLITE_JOURNAL_MODE='DELETE', SQLITE_SYNCHRONOUS='FULL'
+    )
+    engine = create_db_engine(
+        f'sqlite:///{tmp_path / "test.db"}', settings=settings
+    )
+    assert pragma(engine, 'journal_mode') == 'delete'
+    assert pragma(engine, 'synchronous') == FULL
+    engine.dispose()
+
+
+def test_readers_do_not_wait_for_the_writer(tmp_path):
+    engine = create_db_engine(f'sqlite:///{tmp_path / "test.db"}')
+    table_registry.metadata.create_all(engine)
+    with engine.connect() as writer, engine.connect() as reader:
+        writer.exec_driver_sql('BEGIN IMMEDIATE')
+        writer.exec_driver_sql(
+            "INSERT INTO crawl_checkpoints (config_hash, total_properties, "
+            "last_page, updated_at) VALUES ('a', 1, 1, CURRENT_TIMESTAMP)"
+        )
+        # the open write transaction does not block a reader
+        assert reader.scalar(select(func.count(TableCrawlCheckpoint.id))) == 0
+        writer.exec_driver_sql('COMMIT')
+    engine.dispose()
+
+
+def test_importing_schemas_needs_no_database():
+    env = {k: v for k, v in os.environ.items() if k != 'DATABASE_URL'}
+    code = (
+        'import scraping_houses.schemas, scraping_houses.database as db; '
+        'assert "get_engine" in dir(db); '
+        'assert db.get_engine.cache_info().currsize == 0'
+    )
+    subprocess.run([sys.executable, '-c', code], env=env, check=True)
+
+
+def test_importing_the_scraper_needs_no_database():
+    env = {k: v for k, v in os.environ.items() if k != 'DATABASE_URL'}
+    code = (
+        'import scraping_houses.scrapings.vivareal, '
+        'scraping_houses.scrapings.pool, '
+        'scraping_houses.database as db; '
+        'assert db.get_engine.cache_info().currsize == 0'
+    )
+    subprocess.run([sys.executable, '-c', code], env=env, check=True)
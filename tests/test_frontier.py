@@ -0,0 +1,79 @@
+from scraping_houses.frontier import (
+    DONE,
+    FAILED,
+    LEASED,
+    PENDING,
+    PRIORITY_CHANGED,
+    PRIORITY_NEW,
+    PRIORITY_REFRESH,
+    Frontier,
+)
+
+
+def test_claim_by_priority_without_duplicates(engine):
+    a = Frontier(engine, owner='a')
+    b = Frontier(engine, owner='b')
+    a.push(['/refresh'], PRIORITY_REFRESH)
+    a.push(['/changed'], PRIORITY_CHANGED)
+    a.push([f'/new-{n}' for n in range(3)], PRIORITY_NEW)
+
+    first = a.claim(2)
+    second = b.claim(10)
+    assert first == ['/new-0', '/new-1']
+    assert second == ['/new-2', '/changed', '/refresh']
+    assert a.claim(10) == []
+    assert a.remaining() == {LEASED: 5}
+
+
+def test_push_keeps_done_urls_unless_requeued(engine):
+    f = Frontier(engine)
+    f.push(['/a'])
+    f.complete(f.claim(1))
+    f.push(['/a'])
+    assert f.remaining() == {DONE: 1}
+    f.push(['/a'], PRIORITY_REFRESH, requeue=True)
+    assert f.remaining() == {PENDING: 1}
+
+
+def test_fail_retries_then_gives_up(engine):
+    f = Frontier(engine, max_retries=2)
+    f.push(['/a'])
+    f.fail(f.claim(1))
+    assert f.remaining() == {PENDING: 1}
+    f.fail(f.claim(1))
+    assert f.remaining() == {FAILED: 1}
+
+
+def test_expired_and_released_leases_are_claimable(engine):
+    a = Frontier(engine, lease_seconds=-1, owner='a')
+    b = Frontier(engine, owner='b')
+    a.push(['/a', '/b'])
+    assert a.claim(1) == ['/a']
+    # a's lease is already expired
+    assert b.claim(2) == ['/a', '/b']
+    b.release()
+    assert b.remaining() == {PENDING: 2}
+
+
+def test_slugs_of_one_listing_are_one_row(engine):
+    f = Frontier(engine)
+    f.push(['/imovel/casa-id-7/', '/imovel/apartamento-id-7/'])
+    f.push(['/imovel/sobrado-id-7/'], PRIORITY_CHANGED)
+    assert f.remaining() == {PENDING: 1}
+    # fetched once, under the slug it was first pushed with
+    assert f.claim(10) == ['/imovel/casa-id-7/']
+    f.complete(['/imovel/casa-id-7/'])
+    f.push(['/imovel/sobrado-id-7/'], PRIORITY_REFRESH, requeue=True)
+    assert f.claim(10) == ['/imovel/sobrado-id-7/']
+    assert f.remaining() == {LEASED: 1}
+
+
+def test_push_gives_failed_urls_another_round(engine):
+    f = Frontier(engine, max_retries=1)
+    f.push(['/a'])
+    f.fail(f.claim(1))
+    assert f.remaining() == {FAILED: 1}
+    f.push(['/a'])
+    assert f.claim(1) == ['/a']
+    f.fail(['/a'])
+    assert f.remaining() == {FAILED: 1}
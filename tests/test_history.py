@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from scraping_houses.benchmarks.portal import brl
+from scraping_houses.history import (
+    HISTORY_FIELDS,
+    price_history,
+    region_price_series,
+    state_at,
+    timeline,
+)
+from scraping_houses.models import TableProperty, TablePropertyHistory
+from scraping_houses.schemas import FlagHouseType
+
+DAY = timedelta(days=1)
+START = datetime(2024, 8, 1)
+
+
+@pytest.fixture
+def observe(make_property, ingest):
+    """Crawl listing 1 on `day` at `price`."""
+
+    def observe(price: str, day: int, title: str = ''):
+        p = make_property(1, price, region='zona-sul')
+        p.title = title or p.title
+        p.price_cents = int(price.split()[1].replace('.', '')) * 100
+        return ingest([p], now=START + day * DAY)
+
+    return observe
+
+
+def test_stores_only_changes(engine, observe):
+    observe('R$ 2.500', 0)
+    for day in range(1, 10):
+        observe('R$ 2.500', day)
+    observe('R$ 2.300', 10)
+    with Session(engine) as session:
+        rows = timeline(session, 1)
+    # ten crawls without a change cost nothing
+    assert [row.changes['price'] for row in rows] == ['R$ 2.500', 'R$ 2.300']
+    assert set(rows[0].changes) <= set(HISTORY_FIELDS)
+    assert rows[0].changes['price'] == 'R$ 2.500'
+    assert rows[1].changes == {'price': 'R$ 2.300', 'price_cents': 230_000}
+
+
+def test_state_at_and_current_state_agree(engine, observe):
+    observe('R$ 2.500', 0)
+    observe('R$ 2.300', 5, title='Apartamento reformado')
+    observe('R$ 2.400', 9, title='Apartamento reformado')
+    with Session(engine) as session:
+        before = state_at(session, 1, START + 4 * DAY)
+        now = state_at(session, 1, START + 30 * DAY)
+        current = session.scalar(select(TableProperty))
+        assert price_history(session, 1) == [
+            (START, 250_000),
+            (START + 5 * DAY, 230_000),
+            (START + 9 * DAY, 240_000),
+        ]
+    assert before['price'] == 'R$ 2.500'
+    assert before['title'] == 'Apartamento 1'
+    # the fold of the deltas is the materialized row
+    assert now == {f: getattr(current, f) for f in now}
+    assert now['title'] == 'Apartamento reformado'
+
+
+def test_region_price_series(engine, observe, make_property, ingest):
+    observe('R$ 2.000', 0)
+    p = make_property(2, 'R$ 4.000', region='zona-sul')
+    p.price_cents = 400_000
+    ingest([p], now=START)
+    observe('R$ 1.800', 3)
+    with Session(engine) as session:
+        series = region_price_series(session, 'zona-sul')
+        assert region_price_series(session, 'zona-norte') == []
+        plan = session.connection().exec_driver_sql(
+            'EXPLAIN QUERY PLAN SELECT date(observed_at), '
+            'avg(price_cents) FROM property_history '
+            "WHERE region = 'zona-sul' AND price_cents IS NOT NULL "
+            'GROUP BY date(observed_at)'
+        ).all()
+    assert series == [('2024-08-01', 2, 300_000), ('2024-08-04', 1, 180_000)]
+    assert 'ix_property_history_region' in str(plan)
+
+
+def test_cards_record_price_changes(portal, engine, crawl_portal):
+    rent = [
+        p for p in portal.catalogue.listings
+        if p.house_type == FlagHouseType.HENT
+    ]
+    crawl_portal(cards_only=True)
+    crawl_portal(cards_only=True)
+    with Session(engine) as session:
+        assert session.query(TablePropertyHistory).count() == len(rent)
+
+    rent[0].price += 100
+    crawl_portal(cards_only=True)
+    with Session(engine) as session:
+        prices = [price for _, price in price_history(session, rent[0].id)]
+        changes = [row.changes for row in timeline(session, rent[0].id)]
+    assert prices == [(rent[0].price - 100) * 100, rent[0].price * 100]
+    # card, card price change, then what only the detail page shows
+    _, card, detail = changes
+    assert card == {
+        'price': brl(rent[0].price), 'price_cents': rent[0].price * 100
+    }
+    assert 'description' in detail
+    assert 'price' not in detail
+
+    # the card's wording never reaches a row a detail page filled
+    rent[0].price += 100
+    crawl_portal(cards_only=True)
+    with Session(engine) as session:
+        changes = [row.changes for row in timeline(session, rent[0].id)]
+        state = state_at(session, rent[0].id, datetime.now())
+        row = session.scalar(
+            select(TableProperty).filter_by(property_id=rent[0].id)
+        )
+    assert changes[3:] == [
+        {'price_cents': rent[0].price * 100},
+        {'price': brl(rent[0].price)},
+    ]
+    assert state == {f: getattr(row, f) for f in state}
@@ -0,0 +1,91 @@
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from scraping_houses.ingest import upsert_cards
+from scraping_houses.models import TableProperty
+from scraping_houses.schemas import Property
+
+
+def test_counts_inserted_updated_unchanged(engine, make_property, ingest):
+    first = ingest([make_property(n) for n in range(5)])
+    assert (first.inserted, first.updated, first.unchanged) == (5, 0, 0)
+
+    batch = [make_property(n) for n in range(7)]
+    batch[0] = make_property(0, 'R$ 2.300')
+    second = ingest(batch)
+    assert (second.inserted, second.updated, second.unchanged) == (2, 1, 4)
+    with Session(engine) as session:
+        assert session.query(TableProperty).count() == len(batch)
+        row = session.scalar(select(TableProperty).filter_by(url=batch[0].url))
+    assert row.price == 'R$ 2.300'
+    assert row.change_count == 1
+
+
+def test_unchanged_rows_keep_stored_values(engine, make_property, ingest):
+    ingest([make_property(1)])
+    later = make_property(1, published_at='Publicado há 5 dias')
+    assert ingest([later]).unchanged == 1
+    with Session(engine) as session:
+        row = session.scalar(select(TableProperty))
+    assert row.published_at == 'Publicado há 3 dias'
+    assert row.check_interval == 2 * 86400
+
+
+def test_repeated_url_in_a_batch_is_written_once(
+    engine,
+    make_property,
+    ingest,
+):
+    result = ingest([make_property(1), make_property(1, 'R$ 9.000')])
+    assert result.total == 1
+    with Session(engine) as session:
+        assert session.scalar(select(TableProperty.price)) == 'R$ 9.000'
+
+
+def test_statements_scale_with_chunks_not_rows(engine, make_property, ingest):
+    statements = []
+    event.listen(
+        engine,
+        'before_cursor_execute',
+        lambda *args: statements.append(args[2]),
+    )
+    n, chunk_size = 250, 100
+    batch = [make_property(i) for i in range(n)]
+    result = ingest(batch, chunk_size=chunk_size)
+    assert result.inserted == n
+    # a select, an upsert and the history insert per chunk
+    assert len(statements) == 3 * -(-n // chunk_size)
+
+
+def test_property_id_is_parsed_once():
+    p = Property(url='/imovel/apartamento-2-quartos-id-42/?utm_source=x#fotos')
+    assert (p.url, p.property_id) == (
+        '/imovel/apartamento-2-quartos-id-42/', 42
+    )
+    assert Property(url='/imovel/sem-id/').property_id is None
+
+
+def test_url_variations_are_one_property(engine, make_property, ingest):
+    ingest([make_property(7)])
+    moved = make_property(7, 'R$ 2.300')
+    moved.url = '/imovel/casa-nova-id-7/'
+    result = ingest([moved, make_property(8)])
+    assert (result.inserted, result.updated) == (1, 1)
+    with Session(engine) as session:
+        row = session.scalar(select(TableProperty).filter_by(property_id=7))
+        ids = session.scalars(select(TableProperty.property_id)).all()
+    assert sorted(ids) == [7, 8]
+    assert row.url == '/imovel/casa-nova-id-7/'
+    assert row.price == 'R$ 2.300'
+
+
+def test_cards_report_new_and_changed_urls(engine, make_property):
+    card = make_property(1)
+    with Session(engine) as session:
+        assert upsert_cards(session, [card]) == ([card.url], [])
+        assert upsert_cards(session, [make_property(1)]) == ([], [])
+        cheaper = make_property(1, 'R$ 2.300')
+        assert upsert_cards(session, [cheaper]) == ([], [card.url])
+        row = session.scalar(select(TableProperty))
+    assert (row.price, row.price_cents) == ('R$ 2.300', 230_000)
+    assert row.fingerprint is None
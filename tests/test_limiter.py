@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from scraping_houses.scrapings.limiter import (
+    AdaptiveRateLimiter,
+    HostBudget,
+    TokenBucket,
+    is_backoff,
+)
+
+
+def test_token_bucket_spaces_requests():
+    async def run():
+        bucket = TokenBucket(rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 4 / 20 * 0.9
+
+
+def test_host_budget_caps_in_flight_per_host():
+    budget = HostBudget(max_in_flight=2, requests_per_second=1000, burst=10)
+    in_flight = {'a.com': 0, 'b.com': 0}
+    peak = {'a.com': 0, 'b.com': 0}
+
+    async def request(url):
+        host = HostBudget.host(url)
+        async with budget.slot(url):
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+
+    async def run():
+        await asyncio.gather(*(
+            request(f'https://{host}/imovel/{n}')
+            for host in ('a.com', 'b.com')
+            for n in range(6)
+        ))
+
+    asyncio.run(run())
+    assert peak == {'a.com': 2, 'b.com': 2}
+
+
+def test_adaptive_rate_limiter_aimd():
+    limiter = AdaptiveRateLimiter(
+        rate=1.0, min_rate=0.2, max_rate=2.0, increase=0.5, decrease=0.5
+    )
+    limiter.record(200)
+    limiter.record(200)
+    limiter.record(200)
+    assert limiter.rate == limiter.max_rate
+
+    limiter.record(429)
+    assert limiter.rate == 1.0
+    # a second 429 in the same interval is the same congestion event
+    limiter.record(503)
+    assert limiter.rate == 1.0
+    assert limiter.backoffs == 1
+
+    limiter.record(404)
+    assert limiter.rate == 1.0
+
+
+def test_is_backoff():
+    assert is_backoff(429)
+    assert is_backoff(403)
+    assert is_backoff(502)
+    assert not is_backoff(200)
+    assert not is_backoff(404)
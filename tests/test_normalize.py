@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+from scraping_houses.normalize import (
+    amenity_text,
+    normalize_fields,
+    parse_amenities,
+    parse_money_cents,
+    parse_published_at,
+    region_slug,
+)
+
+
+def test_parse_money_cents():
+    assert [
+        parse_money_cents(text)
+        for text in ('R$ 2.500/mês', 'R$ 1.250.000', 'R$ 99,9')
+    ] == [250_000, 125_000_000, 9_990]
+    assert parse_money_cents('Sob consulta') is None
+    assert parse_money_cents(None) is None
+
+
+def test_parse_amenities():
+    assert parse_amenities([
+        '60 m²', '1 quarto', '2 banheiros', '1 vaga', 'Piscina'
+    ]) == {'area_m2': 60, 'bedrooms': 1, 'bathrooms': 2, 'parking_spaces': 1}
+
+
+def test_amenity_text_roundtrip():
+    items = [amenity_text(1, 'quarto'), amenity_text(3, 'vaga')]
+    assert items == ['1 quarto', '3 vagas']
+    assert parse_amenities(items) == {'bedrooms': 1, 'parking_spaces': 3}
+
+
+def test_parse_published_at():
+    now = datetime(2024, 8, 4, 12)
+    assert parse_published_at('Publicado há 3 dias', now) == datetime(
+        2024, 8, 1, 12
+    )
+    assert parse_published_at('há 2 meses', now) == now - timedelta(60)
+    assert parse_published_at('há uma semana', now) == now - timedelta(7)
+    assert parse_published_at('Publicado hoje', now) == now
+    assert parse_published_at('2024-07-01T10:00:00') == datetime(
+        2024, 7, 1, 10
+    )
+    assert parse_published_at('') is None
+
+
+def test_normalize_fields():
+    assert normalize_fields(
+        'R$ 2.500/mês',
+        ['R$ 450'],
+        ['60 m²', '2 quartos'],
+        'Publicado há 1 dia',
+        datetime(2024, 8, 4),
+    ) == {
+        'price_cents': 250_000,
+        'condo_fee_cents': 45_000,
+        'area_m2': 60,
+        'bedrooms': 2,
+        'bathrooms': None,
+        'parking_spaces': None,
+        'published_on': datetime(2024, 8, 3),
+    }
+    assert region_slug('Zona Sul') == 'zona-sul'
@@ -0,0 +1,43 @@
+import asyncio
+
+from scraping_houses.schemas import FlagRegion, UrlConfig
+from scraping_houses.scrapings.planner import PRICE_CEILING, ShardPlanner
+
+# one property per R$ 10 from R$ 0 to R$ 20.000, plus 50 above the ceiling
+PRICES = list(range(0, 20_000, 10)) + [200_000] * 50
+
+
+async def count(cfg: UrlConfig) -> int:
+    top = cfg.max_price or float('inf')
+    return sum(cfg.min_price <= p <= top for p in PRICES)
+
+
+def test_plan_fits_every_shard_under_the_cap():
+    planner = ShardPlanner(count, max_results=300)
+    shards = asyncio.run(planner.plan(UrlConfig()))
+
+    totals = [asyncio.run(count(s)) for s in shards]
+    assert max(totals) <= planner.max_results
+    # bands don't overlap, so nothing is counted twice or missed
+    assert sum(totals) == len(PRICES)
+    assert shards[-1].min_price == PRICE_CEILING[shards[-1].house_type] + 1
+    assert shards[-1].max_price == 0
+
+
+def test_plan_keeps_small_searches_whole():
+    planner = ShardPlanner(count, max_results=10_000)
+    assert asyncio.run(planner.plan(UrlConfig())) == [UrlConfig()]
+
+
+def test_split_by_region_first():
+    planner = ShardPlanner(count, max_results=300, split_regions=True)
+    children = planner.split(UrlConfig())
+    assert [c.region for c in children] == list(FlagRegion)
+
+
+def test_plan_stops_when_the_server_ignores_filters():
+    async def ignored(cfg: UrlConfig) -> int:
+        return len(PRICES)
+
+    planner = ShardPlanner(ignored, max_results=300)
+    assert asyncio.run(planner.plan(UrlConfig())) == [UrlConfig()]
@@ -0,0 +1,93 @@
+import asyncio
+from queue import Queue
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from scraping_houses.frontier import DONE, LEASED, PENDING, Frontier
+from scraping_houses.models import TableFrontier
+from scraping_houses.schemas import (
+    CrawlConfig,
+    CrawlStats,
+    FlagHouseType,
+    Property,
+    UrlConfig,
+)
+from scraping_houses.scrapings import pool, vivareal
+from scraping_houses.scrapings.pool import write_worker
+from scraping_houses.scrapings.vivareal import ScrapingVivalreal
+
+
+def states(engine):
+    with Session(engine) as session:
+        return dict(session.execute(
+            select(TableFrontier.url, TableFrontier.state)
+        ).all())
+
+
+def test_worker_leaves_completion_to_the_writer(
+    engine,
+    make_scraper,
+    fake_session,
+):
+    s = make_scraper()
+    s.sink_completes = False
+    asyncio.run(s.crawl(fake_session(total=10)))
+    urls = [p.url for p in s.written]
+    # leased until the parent's writer completes them
+    assert states(engine) == dict.fromkeys(urls, LEASED)
+    assert Frontier(engine, owner='other').claim(len(urls)) == []
+    Frontier(engine).complete(urls)
+    assert set(states(engine).values()) == {DONE}
+
+
+def test_writer_completes_only_saved_urls(engine, monkeypatch, scraper):
+    urls = ['/imovel/a-id-1/', '/imovel/b-id-2/']
+    frontier = Frontier(engine)
+    frontier.push(urls)
+    frontier.claim(2)
+    monkeypatch.setattr(
+        ScrapingVivalreal,
+        'save_batch',
+        lambda self, batch: (batch[:1], batch[1:]),
+    )
+    queue = Queue()
+    for url in urls:
+        queue.put(Property(url=url).model_dump())
+    queue.put(None)
+    stats = CrawlStats()
+    write_worker(queue, stats, scraper, frontier)
+    assert (stats.detail_pages, stats.errors) == (1, 1)
+    assert states(engine) == {urls[0]: DONE, urls[1]: PENDING}
+
+
+def test_filters_are_verified_once_for_the_whole_crawl(
+    engine,
+    portal,
+    monkeypatch,
+    tmp_path,
+):
+    monkeypatch.setattr(pool, 'get_engine', lambda: engine)
+    monkeypatch.setattr(vivareal, 'get_engine', lambda: engine)
+    # the workers are forked, so they report through a file
+    log = tmp_path / 'verified'
+    log.touch()
+    verify = ScrapingVivalreal.verify_filters
+
+    async def recording(self, session):
+        with log.open('a', encoding='utf-8') as f:
+            f.write(self.url_cfg.model_dump_json() + '\n')
+        return await verify(self, session)
+
+    monkeypatch.setattr(ScrapingVivalreal, 'verify_filters', recording)
+    url_cfg = UrlConfig(url_base=portal.url, rooms=2)
+    crawl_cfg = CrawlConfig(
+        host_requests_per_second=1000, host_max_rate=1000, host_burst=100
+    )
+    stats = pool.crawl_pool(url_cfg, crawl_cfg, workers=2)
+    verified = log.read_text(encoding='utf-8').splitlines()
+    assert verified == [url_cfg.model_dump_json()]
+    assert stats.detail_pages == len([
+        p for p in portal.catalogue.listings
+        if p.house_type == FlagHouseType.HENT and p.rooms == url_cfg.rooms
+    ])
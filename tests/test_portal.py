@@ -0,0 +1,91 @@
+from http import HTTPStatus
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from scraping_houses.benchmarks.portal import PortalServer, brl, load_trace
+from scraping_houses.models import TableProperty
+from scraping_houses.schemas import (
+    FlagHouseType,
+    FlagRegion,
+    PortalConfig,
+    UrlConfig,
+    settings,
+)
+from scraping_houses.scrapings.vivareal import ScrapingVivalreal
+
+
+def test_serves_recorded_home_page(portal):
+    with urlopen(f'{portal.url}/') as r:
+        assert b'Viva Real' in r.read()
+
+
+def test_trace_does_not_depend_on_the_configured_url(monkeypatch):
+    monkeypatch.setattr(settings, 'URL_VIVAREAL', 'http://127.0.0.1:8765')
+    recorded, head = load_trace(settings.TRACE_PATH)
+    assert '/' in recorded
+    assert 'Viva Real' in head
+
+
+def test_search_honours_filters(portal):
+    s = ScrapingVivalreal(UrlConfig(url_base=portal.url))
+    listings = portal.catalogue.listings
+    cfg = UrlConfig(
+        region=FlagRegion.SOUTH_ZONE, rooms=2, min_price=1000, max_price=4000
+    )
+    expected = [
+        p for p in listings
+        if p.house_type == FlagHouseType.HENT
+        and p.region == cfg.region
+        and p.rooms == cfg.rooms
+        and cfg.min_price <= p.price <= cfg.max_price
+    ]
+    with urlopen(portal.url + s.build_url(1, cfg)) as r:
+        html = r.read().decode()
+    assert s.get_total_properties(html) == len(expected)
+    assert [p.url for p in s.get_urls(html)] == [p.url for p in expected]
+
+
+def test_injects_faults():
+    config = PortalConfig(port=0, listings=10, error_rate=1.0)
+    with PortalServer(config) as server:
+        with pytest.raises(HTTPError) as e:
+            urlopen(f'{server.url}/aluguel/sp/sao-paulo/?pagina=1')
+    assert e.value.code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert server.requests == {HTTPStatus.SERVICE_UNAVAILABLE: 1}
+
+
+def test_crawl_against_portal(portal, crawl_portal):
+    rent = [
+        p.url for p in portal.catalogue.listings
+        if p.house_type == FlagHouseType.HENT
+    ]
+    s = crawl_portal(to_db=False)
+    assert sorted(p.url for p in s.written) == sorted(rent)
+    assert all(p.title and p.price for p in s.written)
+
+
+def test_cards_only_fetches_changed_details(portal, engine, crawl_portal):
+    rent = [
+        p for p in portal.catalogue.listings
+        if p.house_type == FlagHouseType.HENT
+    ]
+    first = crawl_portal(cards_only=True)
+    assert first.stats.cards == len(rent)
+    assert first.stats.detail_pages == 0
+    with Session(engine) as session:
+        assert session.query(TableProperty).count() == len(rent)
+
+    rent[0].price += 100
+    second = crawl_portal(cards_only=True)
+    assert second.stats.detail_pages == 1
+    with Session(engine) as session:
+        row = session.scalar(
+            select(TableProperty).filter_by(url=rent[0].url)
+        )
+    assert row.price == brl(rent[0].price)
+    assert row.fingerprint is not None
+    assert row.description == [f'{rent[0].title} em {rent[0].address}.']
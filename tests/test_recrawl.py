@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from scraping_houses.models import TableProperty
+from scraping_houses.recrawl import (
+    MAX_INTERVAL,
+    MIN_INTERVAL,
+    due_urls,
+    fingerprint,
+    next_interval,
+)
+
+
+def test_fingerprint_ignores_relative_dates(make_property):
+    p = make_property(1234)
+    other = make_property(1234)
+    other.published_at = 'Publicado há 4 dias'
+    assert fingerprint(p) == fingerprint(other)
+    assert fingerprint(p) != fingerprint(make_property(1234, 'R$ 2.300'))
+
+
+def test_next_interval_is_bounded():
+    assert next_interval(timedelta(days=1), changed=True) == MIN_INTERVAL
+    assert next_interval(timedelta(days=2), changed=False) == timedelta(4)
+    assert next_interval(MAX_INTERVAL, changed=False) == MAX_INTERVAL
+
+
+def test_save_property_writes_only_changes(engine, scraper, make_property):
+    first = scraper.save_property(make_property(1234))
+    assert first.change_count == 0
+    interval = first.check_interval
+
+    same = scraper.save_property(make_property(1234))
+    assert same.change_count == 0
+    assert same.last_changed_at == first.last_changed_at
+    assert same.check_interval == interval * 2
+
+    cheaper = scraper.save_property(make_property(1234, 'R$ 2.300'))
+    assert cheaper.change_count == 1
+    assert cheaper.price == 'R$ 2.300'
+    assert cheaper.check_interval == interval
+
+    with Session(engine) as session:
+        assert session.query(TableProperty).count() == 1
+
+
+def test_due_urls(engine, scraper, make_property):
+    scraper.save_property(make_property(1234))
+    with Session(engine) as session:
+        assert due_urls(session) == []
+        later = datetime.now() + timedelta(days=2)
+        assert due_urls(session, later) == ['/imovel/apartamento-id-1234/']
+
+
+def test_recrawl_fetches_only_due_properties(
+    engine,
+    scraper,
+    make_scraper,
+    fake_session,
+    make_property,
+):
+    scraper.save_property(make_property(1234))
+    with Session(engine) as session:
+        session.query(TableProperty).update({'next_check_at': None})
+        session.commit()
+
+    s = make_scraper()
+    s.crawl_cfg.recrawl = True
+    session = fake_session(total=100)
+    asyncio.run(s.crawl(session))
+    assert session.calls == ['/imovel/apartamento-id-1234/']
+    assert [p.url for p in s.written] == ['/imovel/apartamento-id-1234/']
+
+
+def test_cards_keep_the_detail_page_text(engine, scraper, make_property):
+    detail = make_property(1234)
+    detail.properties = ['36 m²', '1 quarto']
+    scraper.save_property(detail)
+    card = make_property(1234, 'R$ 2.600')
+    card.properties = ['36 m²', '1 Quartos']
+    scraper.save_cards([card])
+    with Session(engine) as session:
+        row = session.query(TableProperty).one()
+    assert row.properties == ['36 m²', '1 quarto']
+    assert row.price == 'R$ 2.500'
+    assert (row.price_cents, row.bedrooms) == (260_000, 1)
+
+
+def test_delisted_property_is_not_parsed_and_waits(
+    engine,
+    scraper,
+    make_scraper,
+    fake_session,
+    make_property,
+):
+    url = '/imovel/apartamento-id-1234/'
+    scraper.save_property(make_property(1234))
+    with Session(engine) as session:
+        session.query(TableProperty).update({'next_check_at': None})
+        session.commit()
+
+    s = make_scraper(recrawl=True)
+    session = fake_session(total=0, gone=[url])
+    asyncio.run(s.crawl(session))
+    assert session.calls == [url]
+    assert (s.written, s.stats.errors) == ([], 0)
+    with Session(engine) as session:
+        row = session.query(TableProperty).one()
+        assert row.next_check_at > datetime.now()
+        assert due_urls(session) == []
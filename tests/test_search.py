@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from scraping_houses.benchmarks.portal import PUBLISHED_BASE
+from scraping_houses.models import TableProperty
+from scraping_houses.schemas import FlagHouseType, FlagRegion
+from scraping_houses.search import search_properties
+
+
+def test_crawl_fills_typed_columns(portal, engine, crawl_portal):
+    crawl_portal()
+    listings = {
+        p.url: p for p in portal.catalogue.listings
+        if p.house_type == FlagHouseType.HENT
+    }
+    with Session(engine) as session:
+        rows = session.scalars(select(TableProperty)).all()
+    assert len(rows) == len(listings)
+    for row in rows:
+        p = listings[row.url]
+        assert row.price_cents == p.price * 100
+        assert row.condo_fee_cents == (p.condo_fee * 100 or None)
+        assert (row.area_m2, row.bedrooms) == (p.area, p.rooms)
+        assert row.region == str(p.region)
+        assert row.published_on == (
+            PUBLISHED_BASE - timedelta(days=p.published_days)
+        )
+
+
+def test_range_query_uses_the_index(portal, engine, crawl_portal):
+    crawl_portal()
+    query = {
+        'region': FlagRegion.SOUTH_ZONE,
+        'bedrooms': 2,
+        'max_price_cents': 300_000,
+    }
+    expected = [
+        p.url for p in portal.catalogue.listings
+        if p.house_type == FlagHouseType.HENT
+        and p.region == query['region']
+        and p.rooms == query['bedrooms']
+        and p.price * 100 <= query['max_price_cents']
+    ]
+    with Session(engine) as session:
+        found = search_properties(session, **query)
+        plan = session.connection().exec_driver_sql(
+            'EXPLAIN QUERY PLAN SELECT id FROM properties '
+            "WHERE region = 'zona-sul' AND bedrooms = 2 "
+            'AND price_cents <= 300000'
+        ).all()
+    assert expected
+    assert sorted(r.url for r in found) == sorted(expected)
+    prices = [r.price_cents for r in found]
+    assert prices == sorted(prices)
+    assert 'ix_properties_search' in str(plan)
@@ -0,0 +1,47 @@
+import asyncio
+
+from scraping_houses import seen
+from scraping_houses.seen import SeenIndex
+
+
+def test_lookup_and_add(monkeypatch):
+    monkeypatch.setattr(seen, 'MERGE_AT', 4)
+    index = SeenIndex([30, 10, 20, 10])
+    assert sorted(index.ids) == [10, 20, 30]
+    assert '10' in index
+    added = (25, 5, 15, 35)
+    assert not any(id in index for id in added)
+    for id in added:
+        index.add(id)
+    # the buffer was merged, in order
+    merged = [5, 10, 15, 20, 25, 30, 35]
+    assert list(index.ids) == merged
+    assert len(index.recent) == 0
+    index.add(added[-2])
+    assert len(index) == len(merged)
+    assert index.nbytes == len(merged) * 8
+
+
+def test_known_properties_are_not_fetched_again(
+    engine,
+    make_scraper,
+    fake_session,
+):
+    first = make_scraper()
+    first.sink = None
+    known = 30
+    asyncio.run(first.crawl(fake_session(total=known)))
+    assert len(first.seen) == known
+
+    s = make_scraper()
+    s.sink = None
+    total = 40
+    session = fake_session(total=total)
+    asyncio.run(s.crawl(session))
+    assert len(s.seen) == total
+    details = [url for url in session.calls if 'pagina=' not in url]
+    assert len(details) == total - known
+    # kept in step with what was written
+    loaded = SeenIndex.load(engine)
+    assert len(loaded) == len(s.seen)
+    assert all(id in s.seen for id in loaded.ids)
@@ -0,0 +1,379 @@
+import asyncio
+import json
+import re
+import threading
+from types import SimpleNamespace
+
+import pytest
+from parsel import Selector
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from scraping_houses.benchmarks.portal import Catalogue, brl, make_listings
+from scraping_houses.frontier import DONE, Frontier
+from scraping_houses.models import (
+    TableCrawlCheckpoint,
+    TableFrontier,
+    TableProperty,
+)
+from scraping_houses.recrawl import fingerprint
+from scraping_houses.schemas import (
+    FlagOrderByPrice,
+    FlagPropertyType,
+    FlagRegion,
+    Property,
+    UrlConfig,
+)
+from scraping_houses.scrapings import vivareal
+from scraping_houses.scrapings.vivareal import (
+    MAX_PAGES,
+    PAGE_SIZE,
+    ListingUnavailable,
+    ScrapingVivalreal,
+)
+
+
+def test_build_url_without_filters():
+    assert ScrapingVivalreal().build_url(2) == (
+        '/aluguel/sp/sao-paulo/?pagina=2'
+    )
+
+
+def test_build_url_sends_filters_to_the_server():
+    cfg = UrlConfig(
+        region=FlagRegion.SOUTH_ZONE,
+        property_type=[FlagPropertyType.APARTMENT],
+        rooms=2,
+        min_price=1000,
+        max_price=3000,
+        order_by_price=FlagOrderByPrice.PRICE_ASC,
+    )
+    url = ScrapingVivalreal(cfg).build_url(1)
+    assert '#' not in url
+    assert url == (
+        '/aluguel/sp/sao-paulo/zona-sul/apartamento_residencial/'
+        '?pagina=1&quartos=2&preco-desde=1000&preco-ate=3000'
+        '&ordenar-por=preco:ASC'
+    )
+
+
+def test_build_url_many_property_types():
+    cfg = UrlConfig(
+        property_type=[FlagPropertyType.HOUSE, FlagPropertyType.TOWNHOUSE],
+    )
+    assert ScrapingVivalreal(cfg).build_url(1) == (
+        '/aluguel/sp/sao-paulo/'
+        '?pagina=1&tipos=casa_residencial,sobrado_residencial'
+    )
+
+
+def test_filters_applied():
+    assert ScrapingVivalreal.filters_applied(120, 5000)
+    assert not ScrapingVivalreal.filters_applied(5000, 5000)
+
+
+@pytest.mark.parametrize(
+    ('total', 'pages'),
+    [(0, 0), (1, 1), (36, 1), (37, 2), (72, 2), (73, 3)],
+)
+def test_total_pages_rounds_up(total, pages):
+    s = ScrapingVivalreal()
+    s.total_properties = total
+    assert s.total_pages == pages
+
+
+def test_last_listing_page_is_capped():
+    s = ScrapingVivalreal()
+    s.total_properties = PAGE_SIZE * 500
+    assert s.last_listing_page == MAX_PAGES
+
+
+@pytest.mark.parametrize('parallel', [True, False])
+def test_crawl_stops_at_last_page(scraper, parallel, fake_session):
+    scraper.crawl_cfg.parallel_listing = parallel
+    total = 100
+    session = fake_session(total=total)
+    asyncio.run(scraper.crawl(session))
+
+    listing_calls = [u for u in session.calls if 'pagina=' in u]
+    pages = sorted(
+        int(re.search(r'pagina=(\d+)', u).group(1)) for u in listing_calls
+    )
+    assert pages == [1, 2, 3]
+    assert len(scraper.written) == total
+    assert scraper.stats.detail_pages == total
+    assert scraper.last_page == pages[-1]
+
+
+def test_slow_writer_pushes_back_on_fetchers(
+    engine,
+    make_scraper,
+    fake_session,
+):
+    s = make_scraper(
+        concurrency=2,
+        parse_queue_size=2,
+        parse_workers=1,
+        parse_threads=0,
+        write_queue_size=2,
+    )
+    total = 40
+    session = fake_session(total=total)
+    ahead = []
+
+    async def slow_sink(property):
+        details = [u for u in session.calls if 'pagina=' not in u]
+        ahead.append(len(details) - len(s.written))
+        await asyncio.sleep(0.001)
+        s.written.append(property)
+
+    s.sink = slow_sink
+    asyncio.run(s.crawl(session))
+    assert len(s.written) == total
+    # fetchers, parse queue, parser, write queue and the writer
+    assert max(ahead) <= 2 + 2 + 1 + 2 + 1
+
+
+@pytest.mark.parametrize('sharded', [True, False])
+def test_throttled_first_page_is_not_an_empty_search(
+    engine,
+    sharded,
+    make_scraper,
+    fake_session,
+):
+    s = make_scraper(max_retries=1, shard_price_bands=sharded)
+    session = fake_session(total=100, throttled={1})
+    with pytest.raises(ListingUnavailable):
+        asyncio.run(s.crawl(session))
+    assert all('pagina=1' in url for url in session.calls)
+    assert s.stats.errors == 1
+    if not sharded:
+        with Session(engine) as db:
+            checkpoint = db.scalar(select(TableCrawlCheckpoint))
+        assert checkpoint.last_page == 0
+
+
+def test_throttled_listing_page_keeps_the_checkpoint(
+    engine,
+    make_scraper,
+    fake_session,
+):
+    first = make_scraper(max_retries=1)
+    asyncio.run(first.crawl(fake_session(total=100, throttled={2})))
+    assert len(first.written) == 100 - PAGE_SIZE
+    assert first.stats.errors == 1
+    with Session(engine) as session:
+        checkpoint = session.scalar(select(TableCrawlCheckpoint))
+    assert checkpoint.last_page == 1
+
+    second = make_scraper()
+    session = fake_session(total=100)
+    asyncio.run(second.crawl(session))
+    assert '/aluguel/sp/sao-paulo/?pagina=2' in session.calls
+    assert len(second.written) == PAGE_SIZE
+    with Session(engine) as session:
+        assert session.scalar(select(TableCrawlCheckpoint)) is None
+
+
+def test_crawl_resumes_from_checkpoint(engine, make_scraper, fake_session):
+    first = make_scraper(fail_on='id-1005/')
+    first.crawl_cfg.max_retries = 1
+    total = 100
+    asyncio.run(first.crawl(fake_session(total=total)))
+    assert len(first.written) == total - 1
+
+    with Session(engine) as session:
+        checkpoint = session.scalar(select(TableCrawlCheckpoint))
+        assert checkpoint is None  # every listing page was crawled
+        session.execute(
+            TableFrontier.__table__.update()
+            .where(TableFrontier.url.contains('id-1005/'))
+            .values(state='pending')
+        )
+        session.add(
+            TableCrawlCheckpoint(
+                config_hash=first.url_cfg.config_hash,
+                total_properties=100,
+                last_page=2,
+            )
+        )
+        session.commit()
+
+    second = make_scraper()
+    session = fake_session(total=100)
+    asyncio.run(second.crawl(session))
+    # only the missing listing page and the pending detail url are fetched
+    assert sorted(session.calls) == [
+        '/aluguel/sp/sao-paulo/?pagina=3',
+        '/imovel/apartamento-5-id-1005/',
+    ]
+    assert len(second.written) == 1
+
+    with Session(engine) as session:
+        assert session.scalar(select(TableCrawlCheckpoint)) is None
+        states = session.scalars(select(TableFrontier.state)).all()
+    assert set(states) == {DONE}
+
+
+def test_extract_listing_reads_cards_once(monkeypatch):
+    catalogue = Catalogue(make_listings(200))
+    params = {'pagina': '2'}
+    html = catalogue.listing('/aluguel/sp/sao-paulo/', params)
+    html = html.decode()
+    built = []
+    monkeypatch.setattr(
+        vivareal, 'Selector', lambda html: built.append(1) or Selector(html)
+    )
+    content = ScrapingVivalreal().extract_listing(html)
+    assert len(built) == 1
+    assert content.page == int(params['pagina'])
+    rent = catalogue.search('/aluguel/sp/sao-paulo/', {})
+    assert content.total_properties == len(rent)
+    first, card = content.properties[0], rent[PAGE_SIZE]
+    assert first.url == card.url
+    assert first.title == card.title
+    assert first.address == card.address
+    assert first.price == brl(card.price)
+    assert first.properties == [
+        f'{card.area} m²',
+        f'{card.rooms} Quartos',
+        f'{card.bathrooms} Banheiros',
+        f'{card.parking_spaces} Vagas',
+    ]
+
+
+def test_detail_json_state_matches_css():
+    catalogue = Catalogue(make_listings(20))
+    s = ScrapingVivalreal()
+    for card in catalogue.listings:
+        html = catalogue.detail(card).decode()
+        assert s.find_embedded_listing(html, card.id)
+        from_json = s.extract_all_content_from_page(
+            html, Property(url=card.url)
+        )
+        from_css = s.extract_from_css(html, Property(url=card.url))
+        assert fingerprint(from_json) == fingerprint(from_css)
+        assert from_json.price_cents == from_css.price_cents == (
+            card.price * 100
+        )
+        assert from_json.area_m2 == from_css.area_m2 == card.area
+        assert from_json.bedrooms == from_css.bedrooms == card.rooms
+        assert from_json.parking_spaces == card.parking_spaces
+        assert from_json.description == [f'{card.title} em {card.address}.']
+
+
+def test_detail_falls_back_to_css():
+    catalogue = Catalogue(make_listings(1))
+    card = catalogue.listings[0]
+    s = ScrapingVivalreal()
+    broken = catalogue.detail(card).decode().replace(
+        '"pricingInfos"', '"pricing"'
+    )
+    for html in (catalogue.detail(card, embed_state=False).decode(), broken):
+        assert s.find_embedded_listing(html, card.id) is None
+        p = s.extract_all_content_from_page(html, Property(url=card.url))
+        assert p.title == card.title
+        assert p.bathrooms == card.bathrooms
+
+
+def test_detail_json_state_of_another_listing_is_ignored():
+    listing = {
+        'id': '1',
+        'title': 'Apartamento',
+        'pricingInfos': [{'businessType': 'RENTAL', 'price': '19.99'}],
+    }
+    other = {**listing, 'id': '99', 'title': 'Other', 'pricingInfos': [
+        {'businessType': 'SALE', 'price': '900'}
+    ]}
+    state = {'recommendations': [other], 'listing': listing}
+    html = (
+        '<script>window.__INITIAL_STATE__ = '
+        f'{json.dumps(state)};</script>'
+        '<h1 class="description__title">Do html</h1>'
+    )
+    s = ScrapingVivalreal()
+    assert s.find_embedded_listing(html, 99)['title'] == 'Other'
+    p = s.extract_all_content_from_page(html, Property(url='/imovel/x-id-1/'))
+    assert (p.title, p.property_type) == ('Apartamento', 'Aluguel')
+    # no float truncation: 19.99 * 100 is 1998.9999999999998
+    assert p.price_cents == 1999  # noqa: PLR2004
+    p = s.extract_all_content_from_page(html, Property(url='/imovel/x-id-5/'))
+    assert p.title == 'Do html'
+
+
+@pytest.mark.parametrize('threads', [0, 2])
+def test_detail_pages_parse_off_the_event_loop(
+    make_scraper,
+    threads,
+    fake_session,
+):
+    scraper = make_scraper(parse_threads=threads, sample_timings=True)
+    parsed_in = set()
+    extract = scraper.extract_all_content_from_page
+
+    def recording(html, p):
+        parsed_in.add(threading.current_thread().name)
+        return extract(html, p)
+
+    scraper.extract_all_content_from_page = recording
+    total = 40
+    asyncio.run(scraper.crawl(fake_session(total=total)))
+    assert len(scraper.written) == total
+    assert len(scraper.stats.parse_times) == total
+    if threads:
+        assert all(name.startswith('parse') for name in parsed_in)
+    else:
+        assert parsed_in == {'MainThread'}
+    assert scraper.parse_pool is None
+
+
+def test_frontier_io_runs_off_the_event_loop(
+    scraper,
+    monkeypatch,
+    fake_session,
+):
+    threads = set()
+    for name in ('push', 'claim', 'complete', 'release', 'remaining'):
+
+        def recording(self, *args, _method=getattr(Frontier, name), **kw):
+            threads.add(threading.current_thread().name)
+            return _method(self, *args, **kw)
+
+        monkeypatch.setattr(Frontier, name, recording)
+    total = 40
+    asyncio.run(scraper.crawl(fake_session(total=total)))
+    assert len(scraper.written) == total
+    assert threads
+    assert 'MainThread' not in threads
+
+
+def test_writer_flushes_in_batches(engine, make_scraper, fake_session):
+    batch, total = 10, 25
+    s = make_scraper(write_batch_size=batch)
+    s.sink = None
+    asyncio.run(s.crawl(fake_session(total=total)))
+    assert s.stats.flushes == -(-total // batch)
+    # timings are only sampled when asked for
+    assert s.stats.latencies == s.stats.flush_times == []
+    assert s.stats.detail_pages == total
+    with Session(engine) as session:
+        assert session.query(TableProperty).count() == total
+        assert session.scalar(select(TableFrontier.state).distinct()) == DONE
+
+
+def test_writer_flushes_on_interval(engine, make_scraper):
+    s = make_scraper(write_batch_size=1000, write_flush_interval=0.01)
+    s.sink = None
+    s.frontier = SimpleNamespace(complete=lambda urls: None)
+    s.write_queue = asyncio.Queue()
+
+    async def run():
+        writer = asyncio.create_task(s.write_stage())
+        await s.write_queue.put(Property(url='/imovel/a-id-1/'))
+        await asyncio.sleep(0.2)
+        flushed = s.stats.flushes
+        await s.write_queue.put(None)
+        await writer
+        return flushed
+
+    assert asyncio.run(run()) == 1